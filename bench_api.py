@@ -0,0 +1,229 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import campaign_report
+import input_data
+import mock_api
+
+
+# Escalas padrão: vendedores x itens por vendedor x pedidos por vendedor
+ESCALAS_PADRAO = "2x100x500,5x500x2000,10x1000x5000"
+ETAPAS = ("gobots", "store_info", "collect", "campaign")
+
+
+# ======================================================
+# 1) MOCK EM OUTRO PROCESSO
+# ======================================================
+# O mock roda num processo separado para não disputar CPU nem memória com o que está sendo medido
+@contextlib.contextmanager
+def mock_rodando(port, vendedores, itens, pedidos, falhas, host="127.0.0.1"):
+    processo = multiprocessing.Process(
+        target=mock_api.executar_servidor,
+        kwargs=dict(host=host, port=port, vendedores=vendedores, itens=itens, pedidos=pedidos, **falhas),
+        daemon=True,
+    )
+    processo.start()
+    # Escutando em todas as interfaces, o cliente acessa pelo loopback
+    url = f"http://{'127.0.0.1' if host in ('0.0.0.0', '::', '') else host}:{port}"
+    try:
+        for _ in range(200):
+            try:
+                urllib.request.urlopen(f"{url}/__stats", timeout=1).read()
+                break
+            except OSError:
+                time.sleep(0.05)
+        else:
+            raise RuntimeError("O mock não subiu a tempo")
+        yield url
+    finally:
+        processo.terminate()
+        processo.join()
+
+def stats_do_mock(url):
+    """Lê e zera as contagens do mock, para atribuir as requisições a cada etapa."""
+    with urllib.request.urlopen(f"{url}/__stats?reset=1") as resp:
+        return json.load(resp)["rotas"]
+
+
+# ======================================================
+# 2) MEDIÇÃO DE UMA ETAPA
+# ======================================================
+def medir(nome, url, funcao, verbose=False):
+    """
+    Roda funcao() e retorna (resultado, métricas). funcao deve devolver a lista
+    de latências (s) de cada unidade de trabalho (um vendedor, uma chamada...).
+    Memória de pico é a do Python (tracemalloc), só deste processo.
+    """
+    stats_do_mock(url)
+    saida = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    with saida:
+        latencias = funcao()
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rotas = stats_do_mock(url)
+    requisicoes = sum(r["count"] for r in rotas.values())
+    erros = sum(v for r in rotas.values() for k, v in r.items()
+                if k.startswith("status_") and int(k.removeprefix("status_")) >= 400)
+    lat = np.array(latencias) * 1000 if latencias else np.zeros(1)
+    return {
+        "etapa": nome,
+        "segundos": round(duracao, 3),
+        "unidades": len(latencias),
+        "unidades_por_s": round(len(latencias) / duracao, 2) if duracao else None,
+        "requisicoes": requisicoes,
+        "requisicoes_por_s": round(requisicoes / duracao, 1) if duracao else None,
+        "respostas_erro": erros,
+        "p50_ms": round(float(np.percentile(lat, 50)), 1),
+        "p99_ms": round(float(np.percentile(lat, 99)), 1),
+        "pico_memoria_mb": round(pico / 2**20, 1),
+        "rotas": rotas,
+    }
+
+async def _cronometrar(coro):
+    inicio = time.perf_counter()
+    resultado = await coro
+    return resultado, time.perf_counter() - inicio
+
+
+# ======================================================
+# 3) ETAPAS (mesmo caminho de input_data.main e campaign_report)
+# ======================================================
+def etapa_gobots(contexto):
+    async def _rodar():
+        async with input_data.create_session() as session:
+            contexto["go_bots_data"], dt = await _cronometrar(input_data.get_go_bots_api_response(session))
+        return [dt]
+    return asyncio.run(_rodar())
+
+def etapa_store_info(contexto):
+    async def _rodar():
+        async with input_data.create_session() as session:
+            contexto["store_infos"], dt = await _cronometrar(input_data.prefetch_store_info(
+                session, contexto["user_ids"], contexto["go_bots_data"]))
+        return [dt]
+    return asyncio.run(_rodar())
+
+def etapa_collect(contexto):
+    async def _rodar():
+        limiter = input_data.AdaptiveLimiter()
+        async with input_data.create_session(limiter) as session:
+            resultados = await asyncio.gather(*(
+                _cronometrar(input_data.process_user(session, uid, contexto["go_bots_data"], save_csv=False,
+                                                     store_infos=contexto.get("store_infos")))
+                for uid in contexto["user_ids"]
+            ))
+        contexto["limite_final"] = limiter.current_limit
+        return [dt for _, dt in resultados]
+    return asyncio.run(_rodar())
+
+def etapa_campaign(contexto):
+    date_from, date_to = campaign_report.periodo_padrao()
+
+    def _job(uid):
+        token = input_data.get_access_token_from_gobots_api(uid, contexto["go_bots_data"])
+        inicio = time.perf_counter()
+        campaign_report.gerar_relatorio_completo(token, uid, date_from, date_to, contexto["pasta"])
+        return time.perf_counter() - inicio
+
+    with ThreadPoolExecutor(max_workers=campaign_report.VENDEDORES_WORKERS) as executor:
+        return list(executor.map(_job, contexto["user_ids"]))
+
+FUNCOES_ETAPAS = {
+    "gobots": etapa_gobots,
+    "store_info": etapa_store_info,
+    "collect": etapa_collect,
+    "campaign": etapa_campaign,
+}
+
+
+# ======================================================
+# 4) BENCHMARK EM VÁRIAS ESCALAS
+# ======================================================
+def parse_escalas(texto):
+    escalas = []
+    for escala in texto.split(","):
+        vendedores, itens, pedidos = (int(x) for x in escala.lower().split("x"))
+        escalas.append((vendedores, itens, pedidos))
+    return escalas
+
+def rodar_benchmark(escalas, etapas=ETAPAS, port=8089, falhas=None, verbose=False, host="127.0.0.1"):
+    """
+    Para cada escala sobe o mock, aponta input_data e campaign_report para ele e
+    mede cada etapa. Retorna a lista de resultados (um dict por escala e etapa).
+    """
+    falhas = falhas or {}
+    resultados = []
+    urls_originais = (input_data.ML_API_URL, input_data.GOBOTS_API_URL, campaign_report.BASE_URL)
+    diretorio_original = os.getcwd()
+    try:
+        for vendedores, itens, pedidos in escalas:
+            with mock_rodando(port, vendedores, itens, pedidos, falhas, host) as url, \
+                    tempfile.TemporaryDirectory() as pasta:
+                input_data.ML_API_URL = input_data.GOBOTS_API_URL = campaign_report.BASE_URL = url
+                # get_go_bots_api_response lê o token do diretório atual
+                os.chdir(pasta)
+                with open("gobots_token.txt", "w") as f:
+                    f.write("mock")
+                contexto = {
+                    "pasta": pasta,
+                    "user_ids": [mock_api.PRIMEIRO_USER_ID + v for v in range(vendedores)],
+                }
+                # gobots é pré-requisito das demais etapas
+                for etapa in ["gobots"] + [e for e in etapas if e != "gobots"]:
+                    medicao = medir(etapa, url, lambda: FUNCOES_ETAPAS[etapa](contexto), verbose)
+                    medicao["escala"] = f"{vendedores}x{itens}x{pedidos}"
+                    if etapa in etapas:
+                        resultados.append(medicao)
+                        imprimir_linha(medicao)
+                os.chdir(diretorio_original)
+    finally:
+        os.chdir(diretorio_original)
+        input_data.ML_API_URL, input_data.GOBOTS_API_URL, campaign_report.BASE_URL = urls_originais
+    return resultados
+
+def imprimir_linha(m):
+    print(f"[BENCH] {m['escala']:>16} {m['etapa']:<10} {m['segundos']:>8.2f}s "
+          f"{m['unidades_por_s'] or 0:>8.2f} un/s {m['requisicoes_por_s'] or 0:>9.1f} req/s "
+          f"p50 {m['p50_ms']:>9.1f}ms p99 {m['p99_ms']:>9.1f}ms "
+          f"pico {m['pico_memoria_mb']:>7.1f}MB erros {m['respostas_erro']}")
+
+
+def cli(argv=None, prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog, description="Benchmark da coleta e do relatório de campanhas contra o mock_api.py"
+    )
+    mock_api.adicionar_argumentos(parser)
+    parser.add_argument("--scales", default=ESCALAS_PADRAO,
+                        help="Escalas separadas por vírgula, no formato VENDEDORESxITENSxPEDIDOS")
+    parser.add_argument("--stages", default=",".join(ETAPAS), help=f"Etapas medidas ({', '.join(ETAPAS)})")
+    parser.add_argument("--json", metavar="ARQUIVO", help="Também grava os resultados completos em JSON")
+    parser.add_argument("--verbose", action="store_true", help="Mostra os prints das etapas")
+    args = parser.parse_args(argv)
+
+    falhas = dict(latencia_ms=args.latency_ms, jitter_ms=args.jitter_ms, taxa_erro=args.error_rate,
+                  taxa_429=args.rate_limit_rate, retry_after=args.retry_after, seed=args.seed)
+    etapas = [e.strip() for e in args.stages.split(",") if e.strip()]
+    resultados = rodar_benchmark(parse_escalas(args.scales), etapas, args.port, falhas, args.verbose, args.host)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == "__main__":
+    cli()
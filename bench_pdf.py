@@ -0,0 +1,252 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import input_data
+import recommendation_report
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+# Linhas por loja das tabelas de teste e quantos PDFs são gerados ao mesmo tempo
+TAMANHOS_PADRAO = "10,100,1000,10000"
+WORKERS_PADRAO = "1,2,5"
+PASTA_REPO = os.path.dirname(os.path.abspath(__file__))
+
+
+# ======================================================
+# 1) TABELAS DE TESTE (mesmo esquema de output_tables/)
+# ======================================================
+def gerar_fixture(linhas, imagem_url, seed=0):
+    """Tabela de uma loja fictícia com `linhas` produtos, já com as métricas do input_data."""
+    rng = np.random.default_rng(seed + linhas)
+    indices = np.arange(linhas)
+    vendas = rng.zipf(1.8, linhas).clip(max=500)
+    df = pd.DataFrame({
+        'store_name': f'bench_{linhas}',
+        'store_permalink': f'http://perfil.mercadolivre.com.br/BENCH_{linhas}',
+        'item_id': [f'MLB{1000000000 + i}' for i in indices],
+        'title': [f'Produto de teste {i} com um título de tamanho parecido com os reais' for i in indices],
+        'price': rng.uniform(10, 2000, linhas).round(2),
+        'permalink': [f'https://produto.mercadolivre.com.br/MLB-{1000000000 + i}' for i in indices],
+        'visits': vendas * rng.integers(5, 80, linhas),
+        'sales': vendas,
+        'quality_score': pd.array(np.where(indices % 9 == 0, None, rng.integers(40, 100, linhas)), dtype='Int64'),
+        'stock': rng.integers(0, 300, linhas),
+        'image_url': imagem_url,
+        'position': pd.array(np.where(indices % 5 == 0, rng.integers(1, 20, linhas), None), dtype='Int64'),
+    })
+    return input_data.calculate_metrics(df)
+
+def gravar_fixtures(pasta, tamanhos):
+    os.makedirs(os.path.join(pasta, 'output_tables'), exist_ok=True)
+    # Imagem local (copiada para junto das tabelas), para a renderização não depender da rede
+    imagem = Path(shutil.copy(os.path.join(PASTA_REPO, 'gobots_logo.png'), pasta)).resolve().as_uri()
+    caminhos = []
+    for linhas in tamanhos:
+        caminho = os.path.join(pasta, 'output_tables', f'bench_{linhas}.csv')
+        gerar_fixture(linhas, imagem).to_csv(caminho, index=False)
+        caminhos.append(caminho)
+    return caminhos
+
+
+# ======================================================
+# 2) MEMÓRIA DE PICO
+# ======================================================
+class PicoMemoria:
+    """
+    Com psutil, amostra o RSS deste processo somado aos filhos (o Chromium) enquanto
+    o bloco roda. Sem psutil, usa o ru_maxrss do processo, que é o pico desde o início.
+    """
+    INTERVALO = 0.02
+
+    def __init__(self):
+        self.pico = 0
+        self._parar = threading.Event()
+
+    def _rss(self):
+        processo = psutil.Process()
+        total = processo.memory_info().rss
+        for filho in processo.children(recursive=True):
+            try:
+                total += filho.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+
+    def _amostrar(self):
+        while not self._parar.wait(self.INTERVALO):
+            self.pico = max(self.pico, self._rss())
+
+    def __enter__(self):
+        if psutil:
+            self.pico = self._rss()
+            self._thread = threading.Thread(target=self._amostrar, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if psutil:
+            self._parar.set()
+            self._thread.join()
+        else:
+            try:
+                import resource
+                # KB no Linux
+                self.pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            except ImportError:
+                self.pico = None
+        return False
+
+    @property
+    def pico_mb(self):
+        return round(self.pico / 2**20, 1) if self.pico else None
+
+
+# ======================================================
+# 3) UMA LOJA, ETAPA POR ETAPA (mesmo caminho de process_file)
+# ======================================================
+async def renderizar_loja(caminho_csv, template, semaphore, renderer, comprimir, nome=None):
+    tempos = {}
+    inicio = time.perf_counter()
+    df = await recommendation_report.read_input(caminho_csv)
+    tempos['read_input'] = time.perf_counter() - inicio
+
+    fd, html_path = tempfile.mkstemp(suffix='.html')
+    os.close(fd)
+    try:
+        inicio = time.perf_counter()
+        await asyncio.to_thread(recommendation_report.render_store_html, template, df, html_path)
+        tempos['template'] = time.perf_counter() - inicio
+        tamanho_html = os.path.getsize(html_path)
+
+        async with semaphore:
+            inicio = time.perf_counter()
+            pdf_bytes = await recommendation_report.PDF_RENDERERS[renderer](None, html_path)
+            tempos['pdf'] = time.perf_counter() - inicio
+
+            tempos['compressao'] = None
+            pdf_final = pdf_bytes
+            if comprimir:
+                inicio = time.perf_counter()
+                pdf_final = await asyncio.to_thread(recommendation_report.compress_pdf, pdf_bytes)
+                tempos['compressao'] = time.perf_counter() - inicio
+    finally:
+        os.remove(html_path)
+
+    nome = nome or os.path.basename(caminho_csv).removesuffix('.csv')
+    with open(recommendation_report.pdf_path_for(nome), 'wb') as f:
+        f.write(pdf_final)
+
+    return {
+        'linhas': int(df.shape[0]),
+        'tempos_s': {etapa: round(t, 3) if t is not None else None for etapa, t in tempos.items()},
+        'html_kb': round(tamanho_html / 1024, 1),
+        'pdf_kb': round(len(pdf_bytes) / 1024, 1),
+        'pdf_final_kb': round(len(pdf_final) / 1024, 1),
+    }
+
+
+# ======================================================
+# 4) BENCHMARKS
+# ======================================================
+async def medir_etapas(caminhos, renderer, comprimir):
+    """Uma loja de cada vez: tempo de cada etapa, tamanhos e pico de memória por tamanho."""
+    template = recommendation_report.load_template()
+    semaphore = asyncio.Semaphore(1)
+    resultados = []
+    for caminho in caminhos:
+        with PicoMemoria() as memoria:
+            resultado = await renderizar_loja(caminho, template, semaphore, renderer, comprimir)
+        resultado['pico_rss_mb'] = memoria.pico_mb
+        resultados.append(resultado)
+        t = resultado['tempos_s']
+        print(f"[BENCH] {resultado['linhas']:>6} linhas  read {t['read_input']:>7.3f}s  "
+              f"template {t['template']:>7.3f}s  pdf {t['pdf']:>7.3f}s  "
+              f"compressão {t['compressao'] if t['compressao'] is not None else '-':>7}  "
+              f"html {resultado['html_kb']:>9.1f}KB  pdf {resultado['pdf_final_kb']:>9.1f}KB  "
+              f"pico {resultado['pico_rss_mb']}MB")
+    return resultados
+
+async def medir_workers(caminhos, lista_workers, copias, renderer, comprimir):
+    """Todas as lojas (copias vezes cada) de uma vez, com N PDFs simultâneos como em main()."""
+    template = recommendation_report.load_template()
+    resultados = []
+    for workers in lista_workers:
+        semaphore = asyncio.Semaphore(workers)
+        lote = [(c, f"{os.path.basename(c).removesuffix('.csv')}_{n}") for c in caminhos for n in range(copias)]
+        with PicoMemoria() as memoria:
+            inicio = time.perf_counter()
+            await asyncio.gather(*(renderizar_loja(c, template, semaphore, renderer, comprimir, nome)
+                                   for c, nome in lote))
+            duracao = time.perf_counter() - inicio
+        resultado = {
+            'workers': workers,
+            'pdfs': len(lote),
+            'segundos': round(duracao, 2),
+            'pdfs_por_minuto': round(60 * len(lote) / duracao, 1),
+            'pico_rss_mb': memoria.pico_mb,
+        }
+        resultados.append(resultado)
+        print(f"[BENCH] {workers:>2} workers  {len(lote)} PDFs em {duracao:>7.2f}s  "
+              f"{resultado['pdfs_por_minuto']:>7.1f} PDFs/min  pico {resultado['pico_rss_mb']}MB")
+    return resultados
+
+async def rodar_benchmark(tamanhos, lista_workers, copias=1, renderer=recommendation_report.DEFAULT_RENDERER,
+                          comprimir=True):
+    if comprimir and not shutil.which(recommendation_report.GHOSTSCRIPT_EXECUTABLE):
+        print(f"[WARN] {recommendation_report.GHOSTSCRIPT_EXECUTABLE} não encontrado; medindo sem a compressão.")
+        comprimir = False
+
+    diretorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory() as pasta:
+        caminhos = gravar_fixtures(pasta, tamanhos)
+        shutil.copy(os.path.join(PASTA_REPO, recommendation_report.TEMPLATE_FILE), pasta)
+        os.makedirs(os.path.join(pasta, 'output_pdf'), exist_ok=True)
+        # O template e output_pdf/ são relativos ao diretório atual
+        os.chdir(pasta)
+        try:
+            etapas = await medir_etapas(caminhos, renderer, comprimir)
+            workers = await medir_workers(caminhos, lista_workers, copias, renderer, comprimir)
+        finally:
+            os.chdir(diretorio_original)
+    return {'renderer': renderer, 'compressao': comprimir, 'etapas': etapas, 'workers': workers}
+
+
+def cli(argv=None, prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog, description='Benchmark da geração de PDFs com tabelas de teste'
+    )
+    parser.add_argument('--sizes', default=TAMANHOS_PADRAO, help='Linhas por loja, separadas por vírgula')
+    parser.add_argument('--workers', default=WORKERS_PADRAO, help='Quantidades de PDFs simultâneos a comparar')
+    parser.add_argument('--copies', type=int, default=1, help='Quantas vezes cada loja entra no lote dos workers')
+    parser.add_argument('--renderer', choices=sorted(recommendation_report.PDF_RENDERERS),
+                        default=recommendation_report.DEFAULT_RENDERER)
+    parser.add_argument('--no-compress', action='store_true', help='Não mede a etapa do Ghostscript')
+    parser.add_argument('--json', metavar='ARQUIVO', help='Também grava os resultados em JSON')
+    args = parser.parse_args(argv)
+
+    resultado = asyncio.run(rodar_benchmark(
+        [int(t) for t in args.sizes.split(',')],
+        [int(w) for w in args.workers.split(',')],
+        args.copies, args.renderer, not args.no_compress,
+    ))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2)
+
+
+if __name__ == '__main__':
+    cli()
@@ -1,10 +1,18 @@
 import os
+import queue
 import requests
+import string
+import sys
+import threading
 import time
+import numpy as np
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from math import ceil
 from datetime import datetime, timedelta
 
+import rastreio
+
 # ======================================================
 # 1) AUTENTICAÇÃO & CONFIG
 # ======================================================
@@ -23,38 +31,70 @@ def extrair_user_id_de_token(access_token):
     """
     return access_token.split("-")[-1]
 
-ACCESS_TOKEN = carregar_access_token("token.txt")
-USER_ID = extrair_user_id_de_token(ACCESS_TOKEN)
+def montar_headers(access_token):
+    return {
+        "Authorization": f"Bearer {access_token}"
+    }
+
+# Endereço da API: lido da variável ML_API_URL a cada chamada (um valor atribuído aqui tem precedência)
+BASE_URL = None
+
+def base_url():
+    return BASE_URL or os.environ.get("ML_API_URL", "https://api.mercadolibre.com")
 
-HEADERS = {
-    "Authorization": f"Bearer {ACCESS_TOKEN}"
-}
-BASE_URL = "https://api.mercadolibre.com"
+# Cliente de todas as chamadas à API (o cassette.py o substitui para gravar/reproduzir)
+cliente_http = requests
 
 # Intervalo de datas (últimos 30 dias)
 DATE_FORMAT = "%Y-%m-%d"
-DATE_TO = datetime.now().strftime(DATE_FORMAT)
-DATE_FROM = (datetime.now() - timedelta(days=30)).strftime(DATE_FORMAT)
+
+def periodo_padrao(dias=30):
+    """
+    Retorna (date_from, date_to) dos últimos `dias` dias, calculado no momento da chamada.
+    """
+    agora = datetime.now()
+    return (agora - timedelta(days=dias)).strftime(DATE_FORMAT), agora.strftime(DATE_FORMAT)
 
 # Valor "padrão" de ACOS, caso não haja dados
 ACOS_BENCHMARK = 10.0
 
+# Coleta de performance: orçamento de requisições por segundo, threads e tentativas em caso de 429
+PERFORMANCE_RPS = 10
+PERFORMANCE_WORKERS = 8
+PERFORMANCE_MAX_RETRIES = 3
+
+# Quantos vendedores têm o relatório gerado ao mesmo tempo
+VENDEDORES_WORKERS = 4
+
+# Quantas páginas (offset) de campanhas/anúncios são buscadas em paralelo
+PAGINAS_WORKERS = 4
+
+# MULTIGET durante o scroll scan: threads consumidoras e tamanho da fila de lotes de ids
+MULTIGET_WORKERS = 4
+MULTIGET_FILA = 20
+
+# Campos pedidos ao /items (projeção): só o que o relatório lê
+ITEM_CAMPOS = (
+    "id", "title", "sold_quantity", "price", "date_created", "attributes",
+    "category_id", "domain_id", "shipping", "pictures", "listing_type_id", "health",
+)
+
 
 # ======================================================
 # 2) BUSCAR advertiser_id PARA PRODUCT ADS (PADS)
 # ======================================================
-def obter_advertiser_id_pads():
+def obter_advertiser_id_pads(headers):
     """
     Busca todos os advertisers para product_id=PADS e retorna o primeiro, 
     ou None se não existir.
     """
     print("[INFO] Obtendo lista de advertisers para PADS...")
-    url = f"{BASE_URL}/advertising/advertisers?product_id=PADS"
-    headers_local = dict(HEADERS)
+    url = f"{base_url()}/advertising/advertisers?product_id=PADS"
+    headers_local = dict(headers)
     headers_local["Content-Type"] = "application/json"
     headers_local["Api-Version"] = "1"
     
-    resp = requests.get(url, headers=headers_local)
+    resp = cliente_http.get(url, headers=headers_local)
     if not resp.ok:
         print("Status code:", resp.status_code)
         print("Response text:", resp.text)
@@ -76,14 +116,49 @@ def obter_advertiser_id_pads():
 # ======================================================
 # 3) LISTAR CAMPANHAS DE PRODUCT ADS + MÉTRICAS
 # ======================================================
-def listar_campanhas_advertiser(advertiser_id, date_from, date_to, limit=50):
+def _get_pagina(url, headers):
+    resp = cliente_http.get(url, headers=headers)
+    
+    if not resp.ok:
+        print("Status code:", resp.status_code)
+        print("Response text:", resp.text)
+    resp.raise_for_status()
+    
+    return resp.json() or {}
+
+def buscar_paginas_offset(montar_url, headers, limit, max_workers=PAGINAS_WORKERS):
+    """
+    Busca a primeira página para descobrir paging.total e, em seguida,
+    as demais páginas (offset) em paralelo. Retorna os results na ordem.
+    """
+    data = _get_pagina(montar_url(0), headers)
+    primeira = data.get("results", [])
+    if not primeira:
+        return []
+    
+    total = data.get("paging", {}).get("total", 0)
+    offsets = list(range(limit, total, limit))
+    if not offsets:
+        return list(primeira)
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        paginas = list(executor.map(lambda off: _get_pagina(montar_url(off), headers), offsets))
+    
+    resultados = list(primeira)
+    for pagina in paginas:
+        results = pagina.get("results", [])
+        if not results:
+            break
+        resultados.extend(results)
+    return resultados
+
+@rastreio.rastrear("1_campanhas")
+def listar_campanhas_advertiser(headers, advertiser_id, date_from, date_to, limit=50):
     """
     Lista campanhas (/advertisers/{advertiser_id}/product_ads/campaigns),
     incluindo métricas agregadas no período [date_from, date_to].
     """
     print("[INFO] Listando campanhas de Product Ads com métricas...")
-    campaigns = []
-    offset = 0
     
     metrics_fields = (
         "clicks,prints,ctr,cost,cpc,acos,"
@@ -93,12 +168,12 @@ def listar_campanhas_advertiser(advertiser_id, date_from, date_to, limit=50):
         "cvr,roas,sov,direct_amount,indirect_amount,total_amount"
     )
     
-    headers_local = dict(HEADERS)
+    headers_local = dict(headers)
     headers_local["Api-Version"] = "2"
     
-    while True:
-        url = (
-            f"{BASE_URL}/advertising/advertisers/{advertiser_id}/product_ads/campaigns"
+    def montar_url(offset):
+        return (
+            f"{base_url()}/advertising/advertisers/{advertiser_id}/product_ads/campaigns"
             f"?date_from={date_from}"
             f"&date_to={date_to}"
             f"&metrics={metrics_fields}"
@@ -106,27 +181,8 @@ def listar_campanhas_advertiser(advertiser_id, date_from, date_to, limit=50):
             f"&limit={limit}"
             f"&offset={offset}"
         )
-        resp = requests.get(url, headers=headers_local)
-        
-        if not resp.ok:
-            print("Status code:", resp.status_code)
-            print("Response text:", resp.text)
-        resp.raise_for_status()
-        
-        data = resp.json() or {}
-        results = data.get("results", [])
-        if not results:
-            break
-        
-        campaigns.extend(results)
-        
-        paging = data.get("paging", {})
-        total = paging.get("total", 0)
-        
-        offset_next = offset + limit
-        if offset_next >= total:
-            break
-        offset = offset_next
+    
+    campaigns = buscar_paginas_offset(montar_url, headers_local, limit)
     
     print(f"[INFO] Total de {len(campaigns)} campanhas retornadas.")
     return campaigns
@@ -135,16 +191,14 @@ def listar_campanhas_advertiser(advertiser_id, date_from, date_to, limit=50):
 # ======================================================
 # 4) LISTAR ITENS (ANÚNCIOS) DE PRODUCT ADS + MÉTRICAS
 # ======================================================
-def listar_product_ads_items(advertiser_id, date_from, date_to, limit=50):
+@rastreio.rastrear("2_itens_ads")
+def listar_product_ads_items(headers, advertiser_id, date_from, date_to, limit=50):
     """
     Lista todos os anúncios (itens) de Product Ads para um advertiser,
     com métricas no período [date_from, date_to].
     """
     print("[INFO] Listando anúncios de Product Ads + métricas...")
     
-    all_ads_items = []
-    offset = 0
-    
     metrics_fields = (
         "clicks,prints,ctr,cost,cpc,acos,"
         "units_quantity,direct_units_quantity,indirect_units_quantity,"
@@ -153,39 +207,20 @@ def listar_product_ads_items(advertiser_id, date_from, date_to, limit=50):
         "cvr,roas,sov,direct_amount,indirect_amount,total_amount"
     )
     
-    headers_local = dict(HEADERS)
+    headers_local = dict(headers)
     headers_local["Api-Version"] = "2"
     
-    while True:
-        url = (
-            f"{BASE_URL}/advertising/advertisers/{advertiser_id}/product_ads/items"
+    def montar_url(offset):
+        return (
+            f"{base_url()}/advertising/advertisers/{advertiser_id}/product_ads/items"
             f"?limit={limit}"
             f"&offset={offset}"
             f"&date_from={date_from}"
             f"&date_to={date_to}"
             f"&metrics={metrics_fields}"
         )
-        resp = requests.get(url, headers=headers_local)
-        
-        if not resp.ok:
-            print("Status code:", resp.status_code)
-            print("Response text:", resp.text)
-        resp.raise_for_status()
-        
-        data = resp.json() or {}
-        results = data.get("results", [])
-        if not results:
-            break
-        
-        all_ads_items.extend(results)
-        
-        paging = data.get("paging", {})
-        total = paging.get("total", 0)
-        offset_next = offset + limit
-        
-        if offset_next >= total:
-            break
-        offset = offset_next
+    
+    all_ads_items = buscar_paginas_offset(montar_url, headers_local, limit)
     
     print(f"[INFO] Total de {len(all_ads_items)} anúncios retornados.")
     return all_ads_items
@@ -194,11 +229,12 @@ def listar_product_ads_items(advertiser_id, date_from, date_to, limit=50):
 # ======================================================
 # 5) LISTAR TODOS OS ITENS DO VENDEDOR (SCROLL PAGINATION)
 # ======================================================
-def listar_itens_vendedor_sem_limite(user_id, status="active", limit=50):
+def listar_itens_vendedor_sem_limite(headers, user_id, status="active", limit=50, ao_receber_pagina=None):
     """
     Lista TODOS os itens do vendedor via /users/{user_id}/items/search,
     utilizando scroll pagination (search_type=scan), para contornar o limite
     máximo de offset=999.
+    Se ao_receber_pagina for informado, é chamado com os ids de cada página assim que ela chega.
     """
     print(f"[INFO] Listando itens do vendedor {user_id} (scroll scan) com status={status}...")
     
@@ -207,19 +243,19 @@ def listar_itens_vendedor_sem_limite(user_id, status="active", limit=50):
     
     while True:
         if scroll_id:
-            url = (f"{BASE_URL}/users/{user_id}/items/search"
+            url = (f"{base_url()}/users/{user_id}/items/search"
                    f"?status={status}"
                    f"&search_type=scan"
                    f"&scroll_id={scroll_id}"
                    f"&limit={limit}")
         else:
             # Primeira chamada (sem scroll_id)
-            url = (f"{BASE_URL}/users/{user_id}/items/search"
+            url = (f"{base_url()}/users/{user_id}/items/search"
                    f"?status={status}"
                    f"&search_type=scan"
                    f"&limit={limit}")
         
-        resp = requests.get(url, headers=HEADERS)
+        resp = cliente_http.get(url, headers=headers)
         if not resp.ok:
             print("[WARN] Falha ao buscar itens com scan.")
             print("Status code:", resp.status_code)
@@ -235,6 +271,8 @@ def listar_itens_vendedor_sem_limite(user_id, status="active", limit=50):
             break
         
         all_item_ids.extend(results)
+        if ao_receber_pagina:
+            ao_receber_pagina(results)
         
         new_scroll_id = data.get("scroll_id", None)
         if not new_scroll_id or new_scroll_id == scroll_id:
@@ -252,10 +290,10 @@ def listar_itens_vendedor_sem_limite(user_id, status="active", limit=50):
 # ======================================================
 # 6) MULTI-GET /items?ids=..., PARA PEGAR DETALHES EXTRAS
 # ======================================================
-def multiget_items_details(item_ids, chunk_size=20):
+def multiget_items_details(headers, item_ids, chunk_size=20):
     """
     Faz MULTIGET de /items?ids=ID1,ID2,... (até 20 por chamada).
-    Retorna um dicionário { item_id: {dados do item} }.
+    Retorna um dicionário { item_id: ItemCompacto }.
     """
     item_details_map = {}
     unique_ids = list(set(item_ids))
@@ -270,41 +308,175 @@ def multiget_items_details(item_ids, chunk_size=20):
         if not chunk:
             break
         
-        ids_str = ",".join(chunk)
-        url = f"{BASE_URL}/items?ids={ids_str}"
-        resp = requests.get(url, headers=HEADERS)
-        
-        if not resp.ok:
-            print("Status code:", resp.status_code)
-            print("Response text:", resp.text)
-        resp.raise_for_status()
-        
-        data_list = resp.json() or []
-        for obj in data_list:
-            code = obj.get("code")
-            body = obj.get("body", {})
-            if code == 200:
-                _item_id = body.get("id")
-                item_details_map[_item_id] = body
-            else:
-                print(f"[WARN] Erro no multiget para item: {obj}")
+        item_details_map.update(_multiget_chunk(headers, chunk))
     
     print(f"[INFO] Detalhes obtidos para {len(item_details_map)} itens.")
     return item_details_map
 
+class ItemCompacto:
+    """
+    Registro enxuto de um item do /items, extraído no momento da leitura:
+    guarda marca, nº de fotos e frete grátis em vez de attributes/pictures/shipping.
+    """
+    __slots__ = (
+        "id", "title", "sold_quantity", "price", "date_created", "brand",
+        "category_id", "domain_id", "free_shipping", "num_pictures",
+        "listing_type_id", "health",
+    )
+    
+    def __init__(self, body):
+        self.id = body.get("id")
+        self.title = body.get("title")
+        self.sold_quantity = body.get("sold_quantity")
+        self.price = body.get("price")
+        self.date_created = body.get("date_created")
+        self.category_id = body.get("category_id")
+        self.domain_id = body.get("domain_id")
+        self.listing_type_id = body.get("listing_type_id", "")
+        self.health = body.get("health", None)
+        self.free_shipping = (body.get("shipping") or {}).get("free_shipping", False)
+        self.num_pictures = len(body.get("pictures") or [])
+        
+        # Tentar extrair a marca
+        self.brand = ""
+        for attr in body.get("attributes") or []:
+            if attr.get("id") == "BRAND":
+                self.brand = attr.get("value_name", "")
+                break
+
+# Usado quando o multiget não trouxe o item
+ITEM_VAZIO = ItemCompacto({})
+
+def _multiget_chunk(headers, chunk):
+    """
+    Uma chamada de /items?ids=... (até 20 ids), pedindo só ITEM_CAMPOS.
+    Retorna { item_id: ItemCompacto }.
+    """
+    detalhes = {}
+    ids_str = ",".join(chunk)
+    url = f"{base_url()}/items?ids={ids_str}&attributes={','.join(ITEM_CAMPOS)}"
+    resp = cliente_http.get(url, headers=headers)
+    
+    if not resp.ok:
+        print("Status code:", resp.status_code)
+        print("Response text:", resp.text)
+    resp.raise_for_status()
+    
+    data_list = resp.json() or []
+    for obj in data_list:
+        code = obj.get("code")
+        body = obj.get("body", {})
+        if code == 200:
+            _item_id = body.get("id")
+            detalhes[_item_id] = ItemCompacto(body)
+        else:
+            print(f"[WARN] Erro no multiget para item: {obj}")
+    return detalhes
+
+@rastreio.rastrear("3_itens_vendedor")
+def listar_e_detalhar_itens_vendedor(headers, user_id, status="active", limit=50, chunk_size=20,
+                                     consumidores=MULTIGET_WORKERS, tamanho_fila=MULTIGET_FILA):
+    """
+    Faz o scroll scan dos itens do vendedor e, enquanto ele avança, busca os
+    detalhes (MULTIGET) das páginas já recebidas em threads consumidoras.
+    Retorna (lista de item_ids do scan, { item_id: ItemCompacto }).
+    """
+    fila = queue.Queue(maxsize=tamanho_fila)
+    detalhes = {}
+    erros = []
+    lock = threading.Lock()
+    vistos = set()
+    pendentes = []
+    
+    def consumidor():
+        while True:
+            chunk = fila.get()
+            try:
+                if chunk is None:
+                    return
+                parcial = _multiget_chunk(headers, chunk)
+                with lock:
+                    detalhes.update(parcial)
+            except Exception as e:
+                erros.append(e)
+            finally:
+                fila.task_done()
+    
+    def ao_receber_pagina(ids):
+        # O scan espera aqui quando a fila está cheia (consumidores atrasados)
+        novos = [i for i in ids if i not in vistos]
+        vistos.update(novos)
+        pendentes.extend(novos)
+        while len(pendentes) >= chunk_size:
+            fila.put(pendentes[:chunk_size])
+            del pendentes[:chunk_size]
+    
+    threads = [threading.Thread(target=consumidor, daemon=True) for _ in range(consumidores)]
+    for t in threads:
+        t.start()
+    
+    try:
+        item_ids = listar_itens_vendedor_sem_limite(headers, user_id, status, limit, ao_receber_pagina)
+        if pendentes:
+            fila.put(list(pendentes))
+    finally:
+        for _ in threads:
+            fila.put(None)
+        for t in threads:
+            t.join()
+    
+    if erros:
+        raise erros[0]
+    
+    print(f"[INFO] Detalhes obtidos para {len(detalhes)} itens do vendedor (durante o scan).")
+    return item_ids, detalhes
+
 
 # ======================================================
 # 7) API DE PERFORMANCE: /item/{ITEM_ID}/performance
 # ======================================================
-def obter_performance_item(item_id, is_user_product=False):
+class LimitadorDeTaxa:
+    """
+    Distribui as chamadas no tempo para respeitar um máximo de requisições
+    por segundo, compartilhado entre todas as threads.
+    """
+    def __init__(self, requests_per_second):
+        self.intervalo = 1.0 / requests_per_second if requests_per_second and requests_per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._proxima_vaga = time.monotonic()
+    
+    def aguardar(self):
+        if not self.intervalo:
+            return
+        with self._lock:
+            agora = time.monotonic()
+            vaga = max(self._proxima_vaga, agora)
+            self._proxima_vaga = vaga + self.intervalo
+        espera = vaga - agora
+        if espera > 0:
+            time.sleep(espera)
+
+
+def obter_performance_item(headers, item_id, is_user_product=False, limitador=None, max_retries=PERFORMANCE_MAX_RETRIES):
     """
     Retorna dicionário com score, level, level_wording e pendências,
     ou None se der erro (400, 401, 404...).
+    Em caso de 429, espera (Retry-After ou backoff exponencial) e tenta de novo.
     """
     entity = "user-product" if is_user_product else "item"
-    url = f"{BASE_URL}/{entity}/{item_id}/performance"
+    url = f"{base_url()}/{entity}/{item_id}/performance"
     
-    resp = requests.get(url, headers=HEADERS)
+    for tentativa in range(max_retries + 1):
+        if limitador:
+            limitador.aguardar()
+        resp = cliente_http.get(url, headers=headers)
+        if resp.status_code != 429 or tentativa == max_retries:
+            break
+        
+        retry_after = resp.headers.get("Retry-After")
+        espera = float(retry_after) if retry_after and retry_after.isdigit() else 0.5 * (2 ** tentativa)
+        print(f"[WARN] 429 ao obter performance do item {item_id}. Nova tentativa em {espera:.1f}s.")
+        time.sleep(espera)
     
     # Lida com possíveis erros
     if resp.status_code in [400, 401, 404]:
@@ -346,18 +518,88 @@ def obter_performance_item(item_id, is_user_product=False):
         "performance_pending_count": pending_count
     }
 
-def obter_performance_em_lote(item_ids, is_user_product=False, delay_s=0.05):
+def obter_performance_em_lote(headers, item_ids, is_user_product=False,
+                              requests_per_second=PERFORMANCE_RPS, max_workers=PERFORMANCE_WORKERS):
     """
-    Chama obter_performance_item para cada item_id, retornando dict {item_id: ...}.
+    Chama obter_performance_item para cada item_id em um pool de threads,
+    limitado a requests_per_second, retornando dict {item_id: ...}.
     """
-    results = {}
-    for i_id in item_ids:
-        perf = obter_performance_item(i_id, is_user_product=is_user_product)
-        results[i_id] = perf
-        time.sleep(delay_s)
+    limitador = LimitadorDeTaxa(requests_per_second)
+    
+    def _obter(i_id):
+        try:
+            return obter_performance_item(headers, i_id, is_user_product=is_user_product, limitador=limitador)
+        except requests.RequestException as e:
+            print(f"[WARN] Falha de conexão ao obter performance do item {i_id}: {e}")
+            return None
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        perfs = executor.map(_obter, item_ids)
+        results = dict(zip(item_ids, perfs))
     return results
 
 
+# Performance sintética quando /performance falha mas o item tem 'health'
+PERFORMANCE_POR_HEALTH = pd.DataFrame(
+    {
+        "performance_score": [80, 40, 20],
+        "performance_level": ["HEALTHY", "WARNING", "UNHEALTHY"],
+        "performance_level_wording": [
+            "Item em bom estado de exposição",
+            "Item pode perder exposição",
+            "Item está perdendo exposição",
+        ],
+        "performance_pending_count": [0, 1, 2],
+    },
+    index=["healthy", "warning", "unhealthy"],
+)
+PERFORMANCE_COLUNAS = list(PERFORMANCE_POR_HEALTH.columns)
+PERFORMANCE_NAO_AVALIADA = "Não avaliado (fora da pré-seleção)"
+
+def montar_df_performance(item_ids, perf_map, detalhes_todos, nao_avaliados=()):
+    """
+    Monta um DataFrame (item_id, colunas de performance, health) com o
+    resultado da API e, para quem não tem performance, o fallback por health:
+    - health conhecido: valores de PERFORMANCE_POR_HEALTH;
+    - health desconhecido: score 0 e level "(health)";
+    - sem health: "Sem Performance e Sem Health".
+    Itens em nao_avaliados (fora da pré-seleção) ficam marcados como não avaliados.
+    """
+    item_ids = list(item_ids)
+    health = pd.Series([detalhes_todos.get(i, ITEM_VAZIO).health for i in item_ids], dtype=object)
+    perfs = [perf_map.get(i) for i in item_ids]
+    tem_api = pd.Series([p is not None for p in perfs])
+    
+    # Fallback para todos, depois sobrescrito por quem tem resultado da API
+    df = PERFORMANCE_POR_HEALTH.astype(object).reindex(health.where(health.notna(), "")).reset_index(drop=True)
+    sem_health = health.isna()
+    desconhecido = ~sem_health & ~health.isin(PERFORMANCE_POR_HEALTH.index)
+    df.loc[desconhecido, "performance_score"] = 0
+    df.loc[desconhecido, "performance_level"] = "(" + health[desconhecido].astype(str) + ")"
+    df.loc[desconhecido, "performance_level_wording"] = "Health não mapeado"
+    df.loc[desconhecido, "performance_pending_count"] = 0
+    df.loc[sem_health, "performance_score"] = None
+    df.loc[sem_health, "performance_level"] = ""
+    df.loc[sem_health, "performance_level_wording"] = "Sem Performance e Sem Health"
+    df.loc[sem_health, "performance_pending_count"] = 0
+    
+    if len(nao_avaliados):
+        nao_avaliado = pd.Series(item_ids).isin(set(nao_avaliados))
+        df.loc[nao_avaliado, "performance_score"] = None
+        df.loc[nao_avaliado, "performance_level"] = ""
+        df.loc[nao_avaliado, "performance_level_wording"] = PERFORMANCE_NAO_AVALIADA
+        df.loc[nao_avaliado, "performance_pending_count"] = 0
+    
+    if tem_api.any():
+        df_api = pd.DataFrame.from_records([p for p in perfs if p is not None], columns=PERFORMANCE_COLUNAS)
+        df.loc[tem_api, PERFORMANCE_COLUNAS] = df_api.astype(object).to_numpy()
+    
+    df = df.infer_objects()
+    df.insert(0, "item_id", item_ids)
+    df["health"] = health
+    return df
+
+
 # ======================================================
 # 8) DEFINIÇÃO DE LIMIARES (THRESHOLDS) DINÂMICOS
 # ======================================================
@@ -405,155 +647,233 @@ def define_limiares_dinamicos(df_campanhas, df_items_ads):
 # ======================================================
 # 9) GERAÇÃO DE INSIGHTS (INCLUINDO PERFORMANCE & HEALTH)
 # ======================================================
-def gerar_insights_campanhas(df_camp, limiares):
+# Cada regra é (grupo, condição, peso, mensagem):
+# - condição recebe (colunas, limiares) e devolve uma máscara booleana para todas as linhas;
+# - regras do mesmo grupo funcionam como if/elif (vale só a primeira verdadeira);
+# - a mensagem é um template; campos vêm das colunas da linha ou dos limiares.
+WORDING_BASICA = ["básica", "basica", "basic"]
+WORDING_SATISFATORIA = ["satisfatória", "standard", "estándar"]
+WORDING_PROFISSIONAL = ["profissional", "profesional"]
+
+REGRAS_CAMPANHAS = [
+    (None, lambda c, l: c["roas"] < l["ROI_THRESHOLD"], 5,
+     "ROAS {roas:.2f} < {ROI_THRESHOLD:.2f}. Ajustar lances/margens."),
+    (None, lambda c, l: c["acos"] > l["ACOS_BENCHMARK"], 4,
+     "ACOS {acos:.2f}% > {ACOS_BENCHMARK:.2f}%. Reduzir CPC ou otimizar custo."),
+    (None, lambda c, l: c["cpc"] > l["CPC_THRESHOLD"], 3,
+     "CPC R${cpc:.2f} > R${CPC_THRESHOLD:.2f}. Negativar KW caras."),
+    (None, lambda c, l: c["ctr"] < l["CTR_THRESHOLD"], 2,
+     "CTR {ctr:.2f}% < {CTR_THRESHOLD:.2f}%. Melhorar anúncios/criativos."),
+    (None, lambda c, l: (c["cvr"] < l["CVR_THRESHOLD"]) & (c["clicks"] > 30), 3,
+     "CVR {cvr:.2f}% < {CVR_THRESHOLD:.2f}%. Verificar competitividade/preço."),
+    (None, lambda c, l: c["campaign_name"].str.contains("geral", regex=False)
+                        | c["campaign_name"].str.contains("test", regex=False), 1,
+     "Renomear campanha para algo mais específico (evitar rótulos genéricos)."),
+]
+
+REGRAS_ITENS_ADS = [
+    # 1) Health/performance-level
+    ("health", lambda c, l: (c["health"] == "unhealthy") | (c["performance_level"] == "unhealthy"), 10,
+     "Anúncio está com perda de exposição (unhealthy). Atuar urgentemente!"),
+    ("health", lambda c, l: (c["health"] == "warning") | (c["performance_level"] == "warning"), 5,
+     "Anúncio pode perder exposição (warning). Corrigir pendências!"),
+    ("health", lambda c, l: (c["health"] == "healthy") | (c["performance_level"] == "healthy"), 1,
+     "Anúncio está saudável (healthy). Manter boas práticas."),
+    # 2) Regras de roas, acos, cpc, ctr, cvr...
+    (None, lambda c, l: c["roas"] < l["ROI_THRESHOLD"], 5,
+     "ROAS {roas:.2f} < {ROI_THRESHOLD:.2f}. Verificar lances/margens."),
+    (None, lambda c, l: c["acos"] > l["ACOS_BENCHMARK"], 4,
+     "ACOS {acos:.2f}% > {ACOS_BENCHMARK:.2f}%. Otimizar CPC ou negativar KW."),
+    (None, lambda c, l: c["cpc"] > l["CPC_THRESHOLD"], 3,
+     "CPC R${cpc:.2f} > R${CPC_THRESHOLD:.2f}. Negativar KW caras."),
+    (None, lambda c, l: c["ctr"] < l["CTR_THRESHOLD"], 2,
+     "CTR {ctr:.2f}% < {CTR_THRESHOLD:.2f}%. Otimizar imagens/título."),
+    (None, lambda c, l: (c["cvr"] < l["CVR_THRESHOLD"]) & (c["clicks"] > 30), 3,
+     "CVR {cvr:.2f}% < {CVR_THRESHOLD:.2f}%. Revisar ficha/preço."),
+    (None, lambda c, l: c["units_quantity"] > l["BEST_SELLER_THRESHOLD"], 6,
+     "Produto campeão em Ads. Aumentar investimento/segmentação."),
+    # 3) Performance Score
+    ("performance", lambda c, l: c["tem_score"] & c["wording"].isin(WORDING_BASICA), 5,
+     "Qualidade do anúncio '{performance_level_wording}'. Completar pendências (score={performance_score})."),
+    ("performance", lambda c, l: c["tem_score"] & c["wording"].isin(WORDING_SATISFATORIA), 3,
+     "Qualidade mediana '{performance_level_wording}'. Melhorar ações (score={performance_score})."),
+    ("performance", lambda c, l: c["tem_score"] & c["wording"].isin(WORDING_PROFISSIONAL), 1,
+     "Qualidade '{performance_level_wording}'. Pendências: {performance_pending_count}."),
+]
+
+REGRAS_POTENCIAIS = [
+    # 1) Health/performance-level
+    ("health", lambda c, l: (c["health"] == "unhealthy") | (c["performance_level"] == "unhealthy"), 10,
+     "Item perdendo exposição (unhealthy). Necessário corrigir!"),
+    ("health", lambda c, l: (c["health"] == "warning") | (c["performance_level"] == "warning"), 5,
+     "Item pode perder exposição (warning). Corrigir pendências!"),
+    ("health", lambda c, l: (c["health"] == "healthy") | (c["performance_level"] == "healthy"), 1,
+     "Item está saudável (healthy). Potencial positivo."),
+    # 2) Regras básicas (vendas, frete, fotos, preço...)
+    ("vendas", lambda c, l: c["sold_quantity"] > l["BEST_SELLER_THRESHOLD"], 10,
+     "Vendas orgânicas altas. Grande potencial para Ads."),
+    ("vendas", lambda c, l: c["sold_quantity"] > l["BEST_SELLER_THRESHOLD"] * 0.5, 5,
+     "Vendas moderadas. Ads pode escalar."),
+    ("vendas", lambda c, l: c["sempre"], 2,
+     "Vendas baixas. Verificar ROI antes de investir em Ads."),
+    (None, lambda c, l: ~c["free_shipping"], 2,
+     "Considere frete grátis para melhorar conversão."),
+    (None, lambda c, l: c["num_pictures"] < 5, 2,
+     "Poucas fotos ({num_pictures}). Adicionar imagens de qualidade."),
+    ("marca", lambda c, l: c["tem_marca"], 1,
+     "Marca '{brand}'. Destacar na campanha/ficha."),
+    ("marca", lambda c, l: c["sempre"], 1,
+     "Sem marca. Se genérico, avaliar diferencial."),
+    ("preco", lambda c, l: c["price"] <= 0, 5,
+     "Preço não definido ou zero. Corrigir antes de Ads."),
+    ("preco", lambda c, l: c["price"] > 5000, 3,
+     "Preço elevado (R${price:.2f}). Revisar público alvo e CPC."),
+    # 3) Performance Score
+    ("performance", lambda c, l: c["tem_score"] & c["wording"].isin(WORDING_BASICA), 5,
+     "Qualidade do anúncio '{performance_level_wording}'. Corrigir pendências (score={performance_score})."),
+    ("performance", lambda c, l: c["tem_score"] & c["wording"].isin(WORDING_SATISFATORIA), 3,
+     "Qualidade mediana '{performance_level_wording}'. Melhorar para maior exposição (score={performance_score})."),
+    ("performance", lambda c, l: c["tem_score"] & c["wording"].isin(WORDING_PROFISSIONAL), 1,
+     "Boa qualidade '{performance_level_wording}'. Pendências: {performance_pending_count}."),
+]
+
+
+def _coluna(df, nome, padrao):
     """
-    Exemplo de insights para campanhas (não tem 'health').
+    Equivalente vetorizado de row.get(nome, padrao).
     """
-    registros = []
-    for _, row in df_camp.iterrows():
-        r = row.to_dict()
-        
-        acos = row.get("acos", 0.0)
-        cpc = row.get("cpc", 0.0)
-        ctr = row.get("ctr", 0.0)
-        roas = row.get("roas", 0.0)
-        cvr = row.get("cvr", 0.0)
-        clicks = row.get("clicks", 0)
-        
-        prioridade = 0
-        recs = []
-        
-        if roas < limiares["ROI_THRESHOLD"]:
-            recs.append(f"ROAS {roas:.2f} < {limiares['ROI_THRESHOLD']:.2f}. Ajustar lances/margens.")
-            prioridade += 5
-        
-        if acos > limiares["ACOS_BENCHMARK"]:
-            recs.append(f"ACOS {acos:.2f}% > {limiares['ACOS_BENCHMARK']:.2f}%. Reduzir CPC ou otimizar custo.")
-            prioridade += 4
-        
-        if cpc > limiares["CPC_THRESHOLD"]:
-            recs.append(f"CPC R${cpc:.2f} > R${limiares['CPC_THRESHOLD']:.2f}. Negativar KW caras.")
-            prioridade += 3
-        
-        if ctr < limiares["CTR_THRESHOLD"]:
-            recs.append(f"CTR {ctr:.2f}% < {limiares['CTR_THRESHOLD']:.2f}%. Melhorar anúncios/criativos.")
-            prioridade += 2
-        
-        if cvr < limiares["CVR_THRESHOLD"] and clicks > 30:
-            recs.append(f"CVR {cvr:.2f}% < {limiares['CVR_THRESHOLD']:.2f}%. Verificar competitividade/preço.")
-            prioridade += 3
-        
-        camp_name = str(row.get("campaign_name", "")).lower()
-        if "geral" in camp_name or "test" in camp_name:
-            recs.append("Renomear campanha para algo mais específico (evitar rótulos genéricos).")
-            prioridade += 1
-        
-        if not recs:
-            recs.append("Campanha dentro das metas. Monitorar regularmente.")
+    if nome in df.columns:
+        return df[nome]
+    return pd.Series([padrao] * len(df), index=df.index, dtype=object)
+
+def _texto_minusculo(df, nome):
+    """
+    Equivalente vetorizado de (row.get(nome) or "").lower().
+    """
+    return _coluna(df, nome, "").fillna("").astype(str).str.lower()
+
+def _colunas_performance(df):
+    score = _coluna(df, "performance_score", None)
+    wording = _coluna(df, "performance_level_wording", "").fillna("")
+    return {
+        "performance_score": score,
+        # perf_score is not None (NaN conta como presente, como antes)
+        "tem_score": pd.Series(score.to_numpy(dtype=object) != None, index=df.index),  # noqa: E711
+        "performance_level_wording": wording,
+        "wording": wording.astype(str).str.lower(),
+        "performance_pending_count": _coluna(df, "performance_pending_count", 0),
+        "health": _texto_minusculo(df, "health"),
+        "performance_level": _texto_minusculo(df, "performance_level"),
+    }
+
+def _formatar_mensagens(mensagem, colunas, limiares, mask):
+    campos = [campo for _, campo, _, _ in string.Formatter().parse(mensagem) if campo]
+    n = int(mask.sum())
+    if not campos:
+        return np.full(n, mensagem, dtype=object)
+    
+    fixos = {campo: limiares[campo] for campo in campos if campo not in colunas}
+    variaveis = [campo for campo in campos if campo in colunas]
+    valores = [colunas[campo].to_numpy(dtype=object)[mask] for campo in variaveis]
+    # Só as linhas que dispararam a regra são formatadas
+    return np.array(
+        [mensagem.format(**fixos, **dict(zip(variaveis, linha))) for linha in zip(*valores)] if valores
+        else [mensagem.format(**fixos)] * n,
+        dtype=object,
+    )
+
+def aplicar_regras(df, colunas, regras, limiares, mensagem_padrao):
+    """
+    Avalia a tabela de regras sobre o DataFrame inteiro (máscaras booleanas)
+    e devolve uma cópia com as colunas 'prioridade' e 'acoes_e_melhorias',
+    ordenada por prioridade.
+    """
+    df_out = df.reset_index(drop=True)
+    n = len(df_out)
+    colunas = {nome: serie.reset_index(drop=True) for nome, serie in colunas.items()}
+    colunas["sempre"] = pd.Series(np.ones(n, dtype=bool))
+    
+    prioridade = np.zeros(n, dtype="int64")
+    acoes = np.full(n, "", dtype=object)
+    usados_por_grupo = {}
+    
+    for grupo, condicao, peso, mensagem in regras:
+        mask = condicao(colunas, limiares).fillna(False).to_numpy(dtype=bool)
+        if grupo is not None:
+            usados = usados_por_grupo.get(grupo, np.zeros(n, dtype=bool))
+            mask = mask & ~usados
+            usados_por_grupo[grupo] = usados | mask
+        if not mask.any():
+            continue
         
-        r["prioridade"] = prioridade
-        r["acoes_e_melhorias"] = "; ".join(recs)
-        registros.append(r)
+        prioridade += peso * mask
+        textos = _formatar_mensagens(mensagem, colunas, limiares, mask)
+        anteriores = acoes[mask]
+        acoes[mask] = np.where(anteriores == "", textos, anteriores + "; " + textos)
     
-    df_out = pd.DataFrame(registros)
+    acoes[acoes == ""] = mensagem_padrao
+    
+    df_out = df_out.copy()
+    df_out["prioridade"] = prioridade
+    df_out["acoes_e_melhorias"] = acoes
     df_out.sort_values("prioridade", ascending=False, inplace=True)
     return df_out
 
 
+def selecionar_potenciais_para_performance(df_pot, limiares, top_k=None, min_prioridade=None):
+    """
+    Primeira fase da avaliação preguiçosa: ranqueia os potenciais só com o que
+    já temos (vendas, preço, fotos, frete, health), sem /performance, e
+    devolve os item_ids que merecem a consulta: os top_k e/ou os com
+    prioridade prévia >= min_prioridade.
+    """
+    if df_pot.empty:
+        return []
+    
+    previa = gerar_insights_potenciais(
+        df_pot.drop(columns=PERFORMANCE_COLUNAS, errors="ignore"), limiares
+    )
+    if min_prioridade is not None:
+        previa = previa[previa["prioridade"] >= min_prioridade]
+    if top_k is not None:
+        previa = previa.head(top_k)
+    return previa["item_id"].tolist()
+
+
+def gerar_insights_campanhas(df_camp, limiares):
+    """
+    Exemplo de insights para campanhas (não tem 'health').
+    """
+    colunas = {
+        "acos": _coluna(df_camp, "acos", 0.0),
+        "cpc": _coluna(df_camp, "cpc", 0.0),
+        "ctr": _coluna(df_camp, "ctr", 0.0),
+        "roas": _coluna(df_camp, "roas", 0.0),
+        "cvr": _coluna(df_camp, "cvr", 0.0),
+        "clicks": _coluna(df_camp, "clicks", 0),
+        "campaign_name": _coluna(df_camp, "campaign_name", "").astype(str).str.lower(),
+    }
+    return aplicar_regras(df_camp, colunas, REGRAS_CAMPANHAS, limiares,
+                          "Campanha dentro das metas. Monitorar regularmente.")
+
+
 def gerar_insights_itens_ads(df_items, limiares):
     """
     Gera insights considerando ACOS, CPC, CTR, etc.
     E agora também se health/performance_level == unhealthy/warning.
     """
-    registros = []
-    for _, row in df_items.iterrows():
-        r = row.to_dict()
-        
-        acos = row.get("acos", 0.0)
-        cpc = row.get("cpc", 0.0)
-        ctr = row.get("ctr", 0.0)
-        roas = row.get("roas", 0.0)
-        cvr = row.get("cvr", 0.0)
-        clicks = row.get("clicks", 0)
-        units_qty = row.get("units_quantity", 0)
-        
-        # performance e health
-        perf_score = row.get("performance_score", None)
-        perf_level_wording = row.get("performance_level_wording", "")
-        perf_pending = row.get("performance_pending_count", 0)
-        
-        # health pode ser None, 'healthy', 'warning', 'unhealthy'
-        health = (row.get("health") or "").lower()
-        performance_level = (row.get("performance_level") or "").lower()
-        
-        prioridade = 0
-        recs = []
-        
-        # --------------------------------------------------
-        # 1) Health/performance-level
-        # --------------------------------------------------
-        if health == "unhealthy" or performance_level == "unhealthy":
-            recs.append("Anúncio está com perda de exposição (unhealthy). Atuar urgentemente!")
-            prioridade += 10
-        elif health == "warning" or performance_level == "warning":
-            recs.append("Anúncio pode perder exposição (warning). Corrigir pendências!")
-            prioridade += 5
-        elif health == "healthy" or performance_level == "healthy":
-            recs.append("Anúncio está saudável (healthy). Manter boas práticas.")
-            prioridade += 1
-        
-        # --------------------------------------------------
-        # 2) Regras de roas, acos, cpc, ctr, cvr...
-        # --------------------------------------------------
-        if roas < limiares["ROI_THRESHOLD"]:
-            recs.append(f"ROAS {roas:.2f} < {limiares['ROI_THRESHOLD']:.2f}. Verificar lances/margens.")
-            prioridade += 5
-        
-        if acos > limiares["ACOS_BENCHMARK"]:
-            recs.append(f"ACOS {acos:.2f}% > {limiares['ACOS_BENCHMARK']:.2f}%. Otimizar CPC ou negativar KW.")
-            prioridade += 4
-        
-        if cpc > limiares["CPC_THRESHOLD"]:
-            recs.append(f"CPC R${cpc:.2f} > R${limiares['CPC_THRESHOLD']:.2f}. Negativar KW caras.")
-            prioridade += 3
-        
-        if ctr < limiares["CTR_THRESHOLD"]:
-            recs.append(f"CTR {ctr:.2f}% < {limiares['CTR_THRESHOLD']:.2f}%. Otimizar imagens/título.")
-            prioridade += 2
-        
-        if cvr < limiares["CVR_THRESHOLD"] and clicks > 30:
-            recs.append(f"CVR {cvr:.2f}% < {limiares['CVR_THRESHOLD']:.2f}%. Revisar ficha/preço.")
-            prioridade += 3
-        
-        if units_qty > limiares["BEST_SELLER_THRESHOLD"]:
-            recs.append("Produto campeão em Ads. Aumentar investimento/segmentação.")
-            prioridade += 6
-        
-        # --------------------------------------------------
-        # 3) Performance Score
-        # --------------------------------------------------
-        if perf_score is not None:
-            lw = perf_level_wording.lower()
-            if lw in ["básica", "basica", "basic"]:
-                recs.append(f"Qualidade do anúncio '{perf_level_wording}'. Completar pendências (score={perf_score}).")
-                prioridade += 5
-            elif lw in ["satisfatória", "standard", "estándar"]:
-                recs.append(f"Qualidade mediana '{perf_level_wording}'. Melhorar ações (score={perf_score}).")
-                prioridade += 3
-            elif lw in ["profissional", "profesional"]:
-                recs.append(f"Qualidade '{perf_level_wording}'. Pendências: {perf_pending}.")
-                prioridade += 1
-        
-        if not recs:
-            recs.append("Item dentro das metas. Acompanhar normalmente.")
-        
-        r["prioridade"] = prioridade
-        r["acoes_e_melhorias"] = "; ".join(recs)
-        registros.append(r)
-    
-    df_out = pd.DataFrame(registros)
-    df_out.sort_values("prioridade", ascending=False, inplace=True)
-    return df_out
+    colunas = {
+        "acos": _coluna(df_items, "acos", 0.0),
+        "cpc": _coluna(df_items, "cpc", 0.0),
+        "ctr": _coluna(df_items, "ctr", 0.0),
+        "roas": _coluna(df_items, "roas", 0.0),
+        "cvr": _coluna(df_items, "cvr", 0.0),
+        "clicks": _coluna(df_items, "clicks", 0),
+        "units_quantity": _coluna(df_items, "units_quantity", 0),
+        **_colunas_performance(df_items),
+    }
+    return aplicar_regras(df_items, colunas, REGRAS_ITENS_ADS, limiares,
+                          "Item dentro das metas. Acompanhar normalmente.")
 
 
 def gerar_insights_potenciais(df_pot, limiares):
@@ -564,345 +884,423 @@ def gerar_insights_potenciais(df_pot, limiares):
     if df_pot.empty:
         return df_pot
     
-    registros = []
-    for _, row in df_pot.iterrows():
-        r = row.to_dict()
-        
-        sq = row.get("sold_quantity", 0) or 0
-        brand = row.get("brand", "")
-        price = row.get("price", 0.0)
-        pictures = row.get("pictures", [])
-        num_pics = len(pictures)
-        
-        perf_score = row.get("performance_score", None)
-        perf_level_wording = row.get("performance_level_wording", "")
-        perf_pending = row.get("performance_pending_count", 0)
-        
-        shipping_info = row.get("shipping", {})
-        free_shipping = shipping_info.get("free_shipping", False)
-        
-        # health/performance
-        health = (row.get("health") or "").lower()
-        performance_level = (row.get("performance_level") or "").lower()
-        
-        prioridade = 0
-        recs = []
-        
-        # --------------------------------------------------
-        # 1) Health/performance-level
-        # --------------------------------------------------
-        if health == "unhealthy" or performance_level == "unhealthy":
-            recs.append("Item perdendo exposição (unhealthy). Necessário corrigir!")
-            prioridade += 10
-        elif health == "warning" or performance_level == "warning":
-            recs.append("Item pode perder exposição (warning). Corrigir pendências!")
-            prioridade += 5
-        elif health == "healthy" or performance_level == "healthy":
-            recs.append("Item está saudável (healthy). Potencial positivo.")
-            prioridade += 1
-        
-        # --------------------------------------------------
-        # 2) Regras básicas (vendas, frete, fotos, preço...)
-        # --------------------------------------------------
-        if sq > limiares["BEST_SELLER_THRESHOLD"]:
-            recs.append("Vendas orgânicas altas. Grande potencial para Ads.")
-            prioridade += 10
-        elif sq > limiares["BEST_SELLER_THRESHOLD"]*0.5:
-            recs.append("Vendas moderadas. Ads pode escalar.")
-            prioridade += 5
-        else:
-            recs.append("Vendas baixas. Verificar ROI antes de investir em Ads.")
-            prioridade += 2
-        
-        if not free_shipping:
-            recs.append("Considere frete grátis para melhorar conversão.")
-            prioridade += 2
-        
-        if num_pics < 5:
-            recs.append(f"Poucas fotos ({num_pics}). Adicionar imagens de qualidade.")
-            prioridade += 2
-        
-        if brand:
-            recs.append(f"Marca '{brand}'. Destacar na campanha/ficha.")
-            prioridade += 1
-        else:
-            recs.append("Sem marca. Se genérico, avaliar diferencial.")
-            prioridade += 1
-        
-        if price <= 0:
-            recs.append("Preço não definido ou zero. Corrigir antes de Ads.")
-            prioridade += 5
-        elif price > 5000:
-            recs.append(f"Preço elevado (R${price:.2f}). Revisar público alvo e CPC.")
-            prioridade += 3
-        
-        # 3) Performance Score
-        if perf_score is not None:
-            lw = perf_level_wording.lower()
-            if lw in ["básica", "basica", "basic"]:
-                recs.append(f"Qualidade do anúncio '{perf_level_wording}'. Corrigir pendências (score={perf_score}).")
-                prioridade += 5
-            elif lw in ["satisfatória", "standard", "estándar"]:
-                recs.append(f"Qualidade mediana '{perf_level_wording}'. Melhorar para maior exposição (score={perf_score}).")
-                prioridade += 3
-            elif lw in ["profissional", "profesional"]:
-                recs.append(f"Boa qualidade '{perf_level_wording}'. Pendências: {perf_pending}.")
-                prioridade += 1
-        
-        if not recs:
-            recs.append("Item apto a Ads. Monitorar desempenho inicial.")
-        
-        r["prioridade"] = prioridade
-        r["acoes_e_melhorias"] = "; ".join(recs)
-        registros.append(r)
+    brand = _coluna(df_pot, "brand", "")
+    colunas = {
+        "sold_quantity": pd.to_numeric(_coluna(df_pot, "sold_quantity", 0)).fillna(0),
+        "brand": brand,
+        "tem_marca": brand.fillna("").astype(bool),
+        "price": pd.to_numeric(_coluna(df_pot, "price", 0.0)),
+        "num_pictures": _coluna(df_pot, "num_pictures", 0),
+        "free_shipping": _coluna(df_pot, "free_shipping", False).fillna(False).astype(bool),
+        **_colunas_performance(df_pot),
+    }
+    return aplicar_regras(df_pot, colunas, REGRAS_POTENCIAIS, limiares,
+                          "Item apto a Ads. Monitorar desempenho inicial.")
+
+
+# ======================================================
+# 9.1) ESCRITA DO RELATÓRIO (XLSX / CSV / PARQUET)
+# ======================================================
+FORMATOS_SAIDA = ("xlsx", "csv", "parquet")
+FORMATOS_PADRAO = ("xlsx",)
+
+def _valor_celula(v):
+    # Listas/dicts (se houver) viram texto; None/NaN/NaT/pd.NA viram célula vazia;
+    # escalares numpy viram os tipos do Python, que o xlsxwriter aceita
+    if isinstance(v, (list, dict, tuple, set)):
+        return str(v)
+    if pd.isna(v):
+        return None
+    if isinstance(v, np.generic):
+        return v.item()
+    return v
+
+def salvar_xlsx(planilhas, caminho):
+    """
+    Escreve as planilhas linha a linha com xlsxwriter em modo constant_memory:
+    cada linha vai para o disco assim que a próxima começa, então a memória
+    não cresce com o tamanho da planilha. Sem xlsxwriter, usa o ExcelWriter padrão.
+    """
+    try:
+        import xlsxwriter
+    except ImportError:
+        print("[WARN] xlsxwriter não instalado; usando pd.ExcelWriter padrão.")
+        with pd.ExcelWriter(caminho) as writer:
+            for nome, df in planilhas.items():
+                df.to_excel(writer, sheet_name=nome, index=False)
+        return
     
-    df_out = pd.DataFrame(registros)
-    df_out.sort_values("prioridade", ascending=False, inplace=True)
-    return df_out
+    workbook = xlsxwriter.Workbook(caminho, {"constant_memory": True})
+    try:
+        cabecalho = workbook.add_format({"bold": True, "border": 1, "align": "center"})
+        for nome, df in planilhas.items():
+            ws = workbook.add_worksheet(nome)
+            ws.write_row(0, 0, [str(c) for c in df.columns], cabecalho)
+            for r, linha in enumerate(df.itertuples(index=False, name=None), start=1):
+                ws.write_row(r, 0, [_valor_celula(v) for v in linha])
+    finally:
+        workbook.close()
+
+def salvar_relatorio(planilhas, caminho_base, formatos=FORMATOS_PADRAO):
+    """
+    Salva {nome_da_planilha: DataFrame} nos formatos pedidos:
+    - xlsx: um workbook caminho_base.xlsx com todas as planilhas;
+    - csv / parquet: um arquivo por planilha (caminho_base_<planilha>.csv/.parquet).
+    Retorna a lista de arquivos gerados.
+    """
+    arquivos = []
+    for formato in formatos:
+        if formato == "xlsx":
+            caminho = f"{caminho_base}.xlsx"
+            salvar_xlsx(planilhas, caminho)
+            arquivos.append(caminho)
+        elif formato == "csv":
+            for nome, df in planilhas.items():
+                caminho = f"{caminho_base}_{nome}.csv"
+                df.to_csv(caminho, index=False)
+                arquivos.append(caminho)
+        elif formato == "parquet":
+            for nome, df in planilhas.items():
+                caminho = f"{caminho_base}_{nome}.parquet"
+                try:
+                    df.to_parquet(caminho, index=False)
+                except ImportError as e:
+                    print(f"[WARN] Parquet indisponível ({e}); pulando {caminho}.")
+                    continue
+                arquivos.append(caminho)
+        else:
+            raise ValueError(f"Formato de saída desconhecido: {formato}")
+    return arquivos
 
 
 # ======================================================
 # 10) FUNÇÃO PRINCIPAL PARA GERAR O RELATÓRIO COMPLETO
 # ======================================================
-def gerar_relatorio_completo():
-    print("[INFO] Iniciando relatório completo Product Ads + Itens do vendedor + Performance...")
+def gerar_relatorio_completo(access_token, user_id=None, date_from=None, date_to=None, pasta_saida=".",
+                             formatos=FORMATOS_PADRAO, performance_top_k=None, performance_min_prioridade=None,
+                             historico=None):
+    """
+    Gera o relatório de um vendedor e retorna o caminho do primeiro arquivo
+    gerado (o Excel, por padrão), ou None se abortar.
+    Se user_id/date_from/date_to não forem informados, usa o token e os últimos 30 dias.
+    Com performance_top_k e/ou performance_min_prioridade, só os potenciais
+    pré-selecionados têm a performance consultada (ver selecionar_potenciais_para_performance).
+    Com historico (caminho de uma base SQLite), campanhas e anúncios vêm do histórico
+    diário local (historico_ads.py), que só busca na API os dias que faltam.
+    """
+    if user_id is None:
+        user_id = extrair_user_id_de_token(access_token)
+    if date_from is None or date_to is None:
+        date_from, date_to = periodo_padrao()
+    headers = montar_headers(access_token)
     
-    advertiser_id = obter_advertiser_id_pads()
-    if not advertiser_id:
-        print("[ERRO] Não foi possível obter advertiser de PADS. Abortando.")
-        return
+    print(f"[INFO] Iniciando relatório completo Product Ads + Itens do vendedor + Performance (user {user_id})...")
+    # As etapas fecham mesmo se alguma delas levantar exceção
+    with rastreio.Sequencia(seller=user_id) as trilha:
+        trilha.etapa("0_advertiser")
+        advertiser_id = obter_advertiser_id_pads(headers)
+        if not advertiser_id:
+            print("[ERRO] Não foi possível obter advertiser de PADS. Abortando.")
+            return None
     
-    # 1) Listar campanhas
-    campaigns = listar_campanhas_advertiser(advertiser_id, DATE_FROM, DATE_TO)
-    
-    # 2) Listar itens em ads + métricas
-    ads_items = listar_product_ads_items(advertiser_id, DATE_FROM, DATE_TO)
-    
-    # 3) Listar TODOS os itens ativos do vendedor
-    vendedor_item_ids = listar_itens_vendedor_sem_limite(USER_ID, "active", limit=50)
-    
-    # 4) Mapa de anúncios (itens) => ads
-    ads_map = {ad["item_id"]: ad for ad in ads_items}
-    # 5) Itens que não estão em ads => potenciais
-    potenciais_item_ids = [i for i in vendedor_item_ids if i not in ads_map]
-    
-    # 6) MultiGet para TODOS os itens (ads + potenciais), p/ health etc.
-    todos_ids = list(set(ads_map.keys()) | set(potenciais_item_ids))
-    detalhes_todos = multiget_items_details(todos_ids)
-    
-    # 7) Montar DataFrame Campanhas
-    campanhas_rows = []
-    for c in campaigns:
-        c_metrics = c.get("metrics", {})
-        campanhas_rows.append({
-            "campaign_id" : c.get("id"),
-            "campaign_name": c.get("name"),
-            "status"      : c.get("status"),
-            "budget"      : c.get("budget"),
-            "currency_id" : c.get("currency_id"),
-            "strategy"    : c.get("strategy"),
-            "acos_target" : c.get("acos_target"),
-            "channel"     : c.get("channel"),
-            "prints"      : c_metrics.get("prints", 0),
-            "clicks"      : c_metrics.get("clicks", 0),
-            "ctr"         : c_metrics.get("ctr", 0.0),
-            "cost"        : c_metrics.get("cost", 0.0),
-            "cpc"         : c_metrics.get("cpc", 0.0),
-            "acos"        : c_metrics.get("acos", 0.0),
-            "units_quantity"       : c_metrics.get("units_quantity", 0),
-            "direct_units_quantity": c_metrics.get("direct_units_quantity", 0),
-            "indirect_units_quantity": c_metrics.get("indirect_units_quantity", 0),
-            "cvr"         : c_metrics.get("cvr", 0.0),
-            "roas"        : c_metrics.get("roas", 0.0),
-            "sov"         : c_metrics.get("sov", 0.0),
-            "direct_amount"   : c_metrics.get("direct_amount", 0.0),
-            "indirect_amount" : c_metrics.get("indirect_amount", 0.0),
-            "total_amount"    : c_metrics.get("total_amount", 0.0),
-            "organic_units_quantity"     : c_metrics.get("organic_units_quantity", 0),
-            "organic_items_quantity"     : c_metrics.get("organic_items_quantity", 0),
-            "direct_items_quantity"      : c_metrics.get("direct_items_quantity", 0),
-            "indirect_items_quantity"    : c_metrics.get("indirect_items_quantity", 0),
-            "advertising_items_quantity" : c_metrics.get("advertising_items_quantity", 0),
-            "acos_benchmark" : ACOS_BENCHMARK,
-        })
-    df_campanhas = pd.DataFrame(campanhas_rows)
-    
-    # 8) Montar DataFrame ItensEmAds
-    items_ads_rows = []
-    ads_item_ids = []
-    for ad in ads_items:
-        metrics = ad.get("metrics", {})
-        i_id = ad.get("item_id")
-        ads_item_ids.append(i_id)
-        
-        items_ads_rows.append({
-            "item_id": i_id,
-            "campaign_id": ad.get("campaign_id"),
-            "title": ad.get("title"),
-            "status_ads": ad.get("status"),
-            "channel": ad.get("channel"),
-            "date_created": ad.get("date_created"),
-            "listing_type_id": ad.get("listing_type_id"),
-            "buy_box_winner": ad.get("buy_box_winner"),
-            "prints" : metrics.get("prints", 0),
-            "clicks" : metrics.get("clicks", 0),
-            "ctr"    : metrics.get("ctr", 0.0),
-            "cost"   : metrics.get("cost", 0.0),
-            "cpc"    : metrics.get("cpc", 0.0),
-            "acos"   : metrics.get("acos", 0.0),
-            "cvr"    : metrics.get("cvr", 0.0),
-            "roas"   : metrics.get("roas", 0.0),
-            "sov"    : metrics.get("sov", 0.0),
-            "units_quantity"       : metrics.get("units_quantity", 0),
-            "direct_units_quantity": metrics.get("direct_units_quantity", 0),
-            "indirect_units_quantity": metrics.get("indirect_units_quantity", 0),
-            "organic_units_quantity": metrics.get("organic_units_quantity", 0),
-            "organic_items_quantity": metrics.get("organic_items_quantity", 0),
-            "direct_items_quantity"   : metrics.get("direct_items_quantity", 0),
-            "indirect_items_quantity" : metrics.get("indirect_items_quantity", 0),
-            "advertising_items_quantity": metrics.get("advertising_items_quantity", 0),
-            "direct_amount"   : metrics.get("direct_amount", 0.0),
-            "indirect_amount" : metrics.get("indirect_amount", 0.0),
-            "total_amount"    : metrics.get("total_amount", 0.0),
-            "acos_benchmark"  : ACOS_BENCHMARK,
-        })
-    df_items_ads = pd.DataFrame(items_ads_rows)
-    
-    # 9) Montar DataFrame de ItensPotenciais (não estão em Ads)
-    potenciais_rows = []
-    for item_id in potenciais_item_ids:
-        body = detalhes_todos.get(item_id, {})
-        shipping_info = body.get("shipping", {})
+        # 1, 2 e 3 são independentes: rodam ao mesmo tempo
+        trilha.etapa("1-3_listagens")
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            if historico:
+                # 1 e 2) Campanhas e anúncios somados a partir do histórico diário. Os dias
+                #        que faltam são buscados com as listagens deste módulo, que pode ser o
+                #        __main__ com o cassette/as métricas ligados
+                import historico_ads
+                f_historico = executor.submit(historico_ads.campanhas_e_anuncios_do_periodo,
+                                              historico, headers, advertiser_id, date_from, date_to,
+                                              relatorio=sys.modules[__name__])
+            else:
+                # 1) Listar campanhas
+                f_campaigns = executor.submit(listar_campanhas_advertiser, headers, advertiser_id, date_from, date_to)
+            
+                # 2) Listar itens em ads + métricas
+                f_ads_items = executor.submit(listar_product_ads_items, headers, advertiser_id, date_from, date_to)
         
-        # Tentar extrair a marca
-        item_brand = ""
-        attributes_list = body.get("attributes", [])
-        for attr in attributes_list:
-            if attr.get("id") == "BRAND":
-                item_brand = attr.get("value_name", "")
-                break
+            # 3) Listar TODOS os itens ativos do vendedor (já buscando os detalhes durante o scan)
+            f_vendedor = executor.submit(listar_e_detalhar_itens_vendedor, headers, user_id, "active", limit=50)
         
-        potenciais_rows.append({
-            "item_id": item_id,
-            "title": body.get("title"),
-            "sold_quantity": body.get("sold_quantity"),
-            "price": body.get("price"),
-            "date_created": body.get("date_created"),
-            "brand": item_brand,
-            "category_id": body.get("category_id"),
-            "domain_id": body.get("domain_id"),
-            "shipping": shipping_info,
-            "pictures": body.get("pictures", []),
-            "listing_type_id": body.get("listing_type_id", ""),
-            "health": body.get("health", None),
-        })
-    df_potenciais = pd.DataFrame(potenciais_rows)
-    
-    # 10) Obter Performance
-    todos_ids_performance = list(set(ads_item_ids + potenciais_item_ids))
-    
-    print(f"[INFO] Coletando performance de {len(todos_ids_performance)} itens via /item/ID/performance...")
-    perf_map = obter_performance_em_lote(todos_ids_performance, is_user_product=False, delay_s=0.05)
-    
-    # 10.1) Fallback: se performance == None e tivermos 'health', gerar performance sintética
-    for item_id in todos_ids_performance:
-        if perf_map[item_id] is None:
-            body = detalhes_todos.get(item_id, {})
-            h = body.get("health")
-            if h is not None:
-                if h == "healthy":
-                    perf_map[item_id] = {
-                        "performance_score": 80,
-                        "performance_level": "HEALTHY",
-                        "performance_level_wording": "Item em bom estado de exposição",
-                        "performance_pending_count": 0,
-                    }
-                elif h == "warning":
-                    perf_map[item_id] = {
-                        "performance_score": 40,
-                        "performance_level": "WARNING",
-                        "performance_level_wording": "Item pode perder exposição",
-                        "performance_pending_count": 1,
-                    }
-                elif h == "unhealthy":
-                    perf_map[item_id] = {
-                        "performance_score": 20,
-                        "performance_level": "UNHEALTHY",
-                        "performance_level_wording": "Item está perdendo exposição",
-                        "performance_pending_count": 2,
-                    }
-                else:
-                    # valor health desconhecido
-                    perf_map[item_id] = {
-                        "performance_score": 0,
-                        "performance_level": f"({h})",
-                        "performance_level_wording": "Health não mapeado",
-                        "performance_pending_count": 0,
-                    }
+            if historico:
+                campaigns, ads_items = f_historico.result()
             else:
-                perf_map[item_id] = {
-                    "performance_score": None,
-                    "performance_level": "",
-                    "performance_level_wording": "Sem Performance e Sem Health",
-                    "performance_pending_count": 0,
-                }
-    
-    # 11) Enriquecer DF ItensEmAds com performance/health
-    if not df_items_ads.empty:
-        df_items_ads["performance_score"] = df_items_ads["item_id"].apply(
-            lambda i: perf_map[i].get("performance_score", None)
-        )
-        df_items_ads["performance_level"] = df_items_ads["item_id"].apply(
-            lambda i: perf_map[i].get("performance_level", "")
-        )
-        df_items_ads["performance_level_wording"] = df_items_ads["item_id"].apply(
-            lambda i: perf_map[i].get("performance_level_wording", "")
-        )
-        df_items_ads["performance_pending_count"] = df_items_ads["item_id"].apply(
-            lambda i: perf_map[i].get("performance_pending_count", 0)
-        )
-        df_items_ads["health"] = df_items_ads["item_id"].apply(
-            lambda i: detalhes_todos.get(i, {}).get("health", None)
-        )
+                campaigns = f_campaigns.result()
+                ads_items = f_ads_items.result()
+            vendedor_item_ids, detalhes_vendedor = f_vendedor.result()
     
-    # 12) Enriquecer DF Potenciais com performance
-    if not df_potenciais.empty:
-        df_potenciais["performance_score"] = df_potenciais["item_id"].apply(
-            lambda i: perf_map[i].get("performance_score", None)
-        )
-        df_potenciais["performance_level"] = df_potenciais["item_id"].apply(
-            lambda i: perf_map[i].get("performance_level", "")
-        )
-        df_potenciais["performance_level_wording"] = df_potenciais["item_id"].apply(
-            lambda i: perf_map[i].get("performance_level_wording", "")
-        )
-        df_potenciais["performance_pending_count"] = df_potenciais["item_id"].apply(
-            lambda i: perf_map[i].get("performance_pending_count", 0)
-        )
+        # 4) Mapa de anúncios (itens) => ads
+        trilha.etapa("4-6_multiget")
+        ads_map = {ad["item_id"]: ad for ad in ads_items}
+        # 5) Itens que não estão em ads => potenciais
+        potenciais_item_ids = [i for i in vendedor_item_ids if i not in ads_map]
+    
+        # 6) MultiGet para TODOS os itens (ads + potenciais), p/ health etc.
+        #    Os itens do vendedor já vieram com o scan; faltam só os de Ads fora dele
+        detalhes_todos = dict(detalhes_vendedor)
+        vendedor_set = set(vendedor_item_ids)
+        faltantes_ids = [i for i in ads_map if i not in vendedor_set]
+        if faltantes_ids:
+            detalhes_todos.update(multiget_items_details(headers, faltantes_ids))
+    
+        # 7) Montar DataFrame Campanhas
+        trilha.etapa("7_df_campanhas")
+        campanhas_rows = []
+        for c in campaigns:
+            c_metrics = c.get("metrics", {})
+            campanhas_rows.append({
+                "campaign_id" : c.get("id"),
+                "campaign_name": c.get("name"),
+                "status"      : c.get("status"),
+                "budget"      : c.get("budget"),
+                "currency_id" : c.get("currency_id"),
+                "strategy"    : c.get("strategy"),
+                "acos_target" : c.get("acos_target"),
+                "channel"     : c.get("channel"),
+                "prints"      : c_metrics.get("prints", 0),
+                "clicks"      : c_metrics.get("clicks", 0),
+                "ctr"         : c_metrics.get("ctr", 0.0),
+                "cost"        : c_metrics.get("cost", 0.0),
+                "cpc"         : c_metrics.get("cpc", 0.0),
+                "acos"        : c_metrics.get("acos", 0.0),
+                "units_quantity"       : c_metrics.get("units_quantity", 0),
+                "direct_units_quantity": c_metrics.get("direct_units_quantity", 0),
+                "indirect_units_quantity": c_metrics.get("indirect_units_quantity", 0),
+                "cvr"         : c_metrics.get("cvr", 0.0),
+                "roas"        : c_metrics.get("roas", 0.0),
+                "sov"         : c_metrics.get("sov", 0.0),
+                "direct_amount"   : c_metrics.get("direct_amount", 0.0),
+                "indirect_amount" : c_metrics.get("indirect_amount", 0.0),
+                "total_amount"    : c_metrics.get("total_amount", 0.0),
+                "organic_units_quantity"     : c_metrics.get("organic_units_quantity", 0),
+                "organic_items_quantity"     : c_metrics.get("organic_items_quantity", 0),
+                "direct_items_quantity"      : c_metrics.get("direct_items_quantity", 0),
+                "indirect_items_quantity"    : c_metrics.get("indirect_items_quantity", 0),
+                "advertising_items_quantity" : c_metrics.get("advertising_items_quantity", 0),
+                "acos_benchmark" : ACOS_BENCHMARK,
+            })
+        df_campanhas = pd.DataFrame(campanhas_rows)
     
-    # 13) Definir limites dinamicamente
-    limiares = define_limiares_dinamicos(df_campanhas, df_items_ads)
-    print("[INFO] Limiar(es) calculado(s) dinamicamente:", limiares)
+        # 8) Montar DataFrame ItensEmAds
+        trilha.etapa("8_df_itens_ads")
+        items_ads_rows = []
+        ads_item_ids = []
+        for ad in ads_items:
+            metrics = ad.get("metrics", {})
+            i_id = ad.get("item_id")
+            ads_item_ids.append(i_id)
+        
+            items_ads_rows.append({
+                "item_id": i_id,
+                "campaign_id": ad.get("campaign_id"),
+                "title": ad.get("title"),
+                "status_ads": ad.get("status"),
+                "channel": ad.get("channel"),
+                "date_created": ad.get("date_created"),
+                "listing_type_id": ad.get("listing_type_id"),
+                "buy_box_winner": ad.get("buy_box_winner"),
+                "prints" : metrics.get("prints", 0),
+                "clicks" : metrics.get("clicks", 0),
+                "ctr"    : metrics.get("ctr", 0.0),
+                "cost"   : metrics.get("cost", 0.0),
+                "cpc"    : metrics.get("cpc", 0.0),
+                "acos"   : metrics.get("acos", 0.0),
+                "cvr"    : metrics.get("cvr", 0.0),
+                "roas"   : metrics.get("roas", 0.0),
+                "sov"    : metrics.get("sov", 0.0),
+                "units_quantity"       : metrics.get("units_quantity", 0),
+                "direct_units_quantity": metrics.get("direct_units_quantity", 0),
+                "indirect_units_quantity": metrics.get("indirect_units_quantity", 0),
+                "organic_units_quantity": metrics.get("organic_units_quantity", 0),
+                "organic_items_quantity": metrics.get("organic_items_quantity", 0),
+                "direct_items_quantity"   : metrics.get("direct_items_quantity", 0),
+                "indirect_items_quantity" : metrics.get("indirect_items_quantity", 0),
+                "advertising_items_quantity": metrics.get("advertising_items_quantity", 0),
+                "direct_amount"   : metrics.get("direct_amount", 0.0),
+                "indirect_amount" : metrics.get("indirect_amount", 0.0),
+                "total_amount"    : metrics.get("total_amount", 0.0),
+                "acos_benchmark"  : ACOS_BENCHMARK,
+            })
+        df_items_ads = pd.DataFrame(items_ads_rows)
+    
+        # 9) Montar DataFrame de ItensPotenciais (não estão em Ads)
+        trilha.etapa("9_df_potenciais")
+        potenciais_rows = []
+        for item_id in potenciais_item_ids:
+            item = detalhes_todos.get(item_id, ITEM_VAZIO)
+        
+            potenciais_rows.append({
+                "item_id": item_id,
+                "title": item.title,
+                "sold_quantity": item.sold_quantity,
+                "price": item.price,
+                "date_created": item.date_created,
+                "brand": item.brand,
+                "category_id": item.category_id,
+                "domain_id": item.domain_id,
+                "free_shipping": item.free_shipping,
+                "num_pictures": item.num_pictures,
+                "listing_type_id": item.listing_type_id,
+                "health": item.health,
+            })
+        df_potenciais = pd.DataFrame(potenciais_rows)
+    
+        # 10) Obter Performance (opcionalmente só dos potenciais pré-selecionados)
+        trilha.etapa("10_performance")
+        potenciais_avaliados = potenciais_item_ids
+        if performance_top_k is not None or performance_min_prioridade is not None:
+            limiares_previos = define_limiares_dinamicos(df_campanhas, df_items_ads)
+            potenciais_avaliados = selecionar_potenciais_para_performance(
+                df_potenciais, limiares_previos, performance_top_k, performance_min_prioridade
+            )
+            print(f"[INFO] Pré-seleção: {len(potenciais_avaliados)} de {len(potenciais_item_ids)} potenciais terão performance consultada.")
+    
+        todos_ids_performance = list(set(ads_item_ids + potenciais_avaliados))
+    
+        print(f"[INFO] Coletando performance de {len(todos_ids_performance)} itens via /item/ID/performance...")
+        perf_map = obter_performance_em_lote(headers, todos_ids_performance, is_user_product=False)
+    
+        # 10.1) Performance + fallback por 'health' num único DataFrame (uma linha por item)
+        avaliados_set = set(todos_ids_performance)
+        nao_avaliados = [i for i in potenciais_item_ids if i not in avaliados_set]
+        df_perf = montar_df_performance(todos_ids_performance + nao_avaliados, perf_map, detalhes_todos,
+                                        nao_avaliados=nao_avaliados)
+    
+        # 11) Enriquecer DF ItensEmAds com performance/health
+        trilha.etapa("11-12_enriquecimento")
+        if not df_items_ads.empty:
+            df_items_ads = df_items_ads.merge(df_perf, on="item_id", how="left")
+    
+        # 12) Enriquecer DF Potenciais com performance
+        if not df_potenciais.empty:
+            df_potenciais = df_potenciais.merge(df_perf.drop(columns=["health"]), on="item_id", how="left")
+    
+        # 13) Definir limites dinamicamente
+        trilha.etapa("13_limiares")
+        limiares = define_limiares_dinamicos(df_campanhas, df_items_ads)
+        print("[INFO] Limiar(es) calculado(s) dinamicamente:", limiares)
+    
+        # 14) Gerar Insights
+        trilha.etapa("14_insights")
+        df_camp_insights = gerar_insights_campanhas(df_campanhas, limiares)
+        df_items_insights = gerar_insights_itens_ads(df_items_ads, limiares)
+        df_pot_insights = gerar_insights_potenciais(df_potenciais, limiares)
+    
+        # 15) Salvar Excel (e/ou CSV/Parquet por planilha)
+        trilha.etapa("15_salvar")
+        data_hoje = datetime.now().strftime("%Y-%m-%d")
+        caminho_base = os.path.join(pasta_saida, f"product_ads_relatorio_{user_id}_{data_hoje}")
+    
+        arquivos = salvar_relatorio({
+            "Campanhas": df_camp_insights,
+            "ItensEmAds": df_items_insights,
+            "ItensPotenciais": df_pot_insights,
+        }, caminho_base, formatos)
+    
+        nome_arquivo = arquivos[0] if arquivos else None
+        print(f"[INFO] Relatório gerado com sucesso: {', '.join(arquivos)}")
+        return nome_arquivo
+
+
+# ======================================================
+# 11) VÁRIOS VENDEDORES NO MESMO PROCESSO
+# ======================================================
+def obter_dados_gobots():
+    """
+    Busca os tokens de todos os vendedores na mesma fonte (/ml/all) usada por input_data.py.
+    """
+    import asyncio
+    import input_data
     
-    # 14) Gerar Insights
-    df_camp_insights = gerar_insights_campanhas(df_campanhas, limiares)
-    df_items_insights = gerar_insights_itens_ads(df_items_ads, limiares)
-    df_pot_insights = gerar_insights_potenciais(df_potenciais, limiares)
+    async def _buscar():
+        async with input_data.create_session() as session:
+            return await input_data.get_go_bots_api_response(session)
+    
+    return asyncio.run(_buscar())
+
+def gerar_relatorios_vendedores(user_ids, go_bots_data, max_workers=VENDEDORES_WORKERS, pasta_saida=".",
+                                **opcoes):
+    """
+    Roda gerar_relatorio_completo para vários vendedores em paralelo.
+    opcoes (formatos, performance_top_k...) são repassadas a cada relatório.
+    Retorna dict {user_id: caminho do Excel ou None}.
+    """
+    from input_data import get_access_token_from_gobots_api
     
-    # 15) Salvar Excel
-    data_hoje = datetime.now().strftime("%Y-%m-%d")
-    nome_arquivo = f"product_ads_relatorio_{USER_ID}_{data_hoje}.xlsx"
+    date_from, date_to = periodo_padrao()
+    os.makedirs(pasta_saida, exist_ok=True)
     
-    with pd.ExcelWriter(nome_arquivo) as writer:
-        df_camp_insights.to_excel(writer, sheet_name="Campanhas", index=False)
-        df_items_insights.to_excel(writer, sheet_name="ItensEmAds", index=False)
-        df_pot_insights.to_excel(writer, sheet_name="ItensPotenciais", index=False)
+    def _job(user_id):
+        access_token = get_access_token_from_gobots_api(user_id, go_bots_data)
+        if not access_token:
+            print(f"[WARN] Sem access token para o vendedor {user_id}.")
+            return None
+        try:
+            return gerar_relatorio_completo(access_token, user_id, date_from, date_to, pasta_saida, **opcoes)
+        except Exception as e:
+            print(f"[ERRO] Falha no relatório do vendedor {user_id}: {e}")
+            return None
     
-    print(f"[INFO] Relatório gerado com sucesso: {nome_arquivo}")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        arquivos = executor.map(_job, user_ids)
+        return dict(zip(user_ids, arquivos))
 
 
 # ======================================================
-# 11) EXECUÇÃO
+# 12) EXECUÇÃO
 # ======================================================
+def cli(argv=None, prog=None):
+    import argparse
+    
+    import cassette
+    import input_data
+    import metricas_http
+    
+    parser = argparse.ArgumentParser(prog=prog, description="Relatório de Product Ads por vendedor")
+    parser.add_argument("--user-ids", metavar="ARQUIVO",
+                        help="Gera um relatório por vendedor listado no arquivo (ex.: user_ids.txt), "
+                             "com tokens obtidos da GoBots. Sem esta opção, usa token.txt.")
+    parser.add_argument("--workers", type=int, default=VENDEDORES_WORKERS)
+    parser.add_argument("--saida", default=".", help="Pasta onde os Excel serão salvos")
+    parser.add_argument("--formatos", default=",".join(FORMATOS_PADRAO),
+                        help=f"Formatos de saída separados por vírgula ({', '.join(FORMATOS_SAIDA)})")
+    parser.add_argument("--performance-top-k", type=int, default=None,
+                        help="Consulta performance só dos K potenciais melhor ranqueados na pré-seleção")
+    parser.add_argument("--performance-min-prioridade", type=int, default=None,
+                        help="Consulta performance só dos potenciais com prioridade prévia >= N")
+    parser.add_argument("--historico", metavar="ARQUIVO.db", default=None,
+                        help="Usa o histórico diário de Product Ads nesta base SQLite (só busca os dias que faltam)")
+    cassette.adicionar_argumentos(parser)
+    metricas_http.adicionar_argumentos(parser)
+    rastreio.adicionar_argumentos(parser)
+    args = parser.parse_args(argv)
+    cassette.ativar_por_argumentos(args, sys.modules[__name__], input_data)
+    metricas_http.ativar_por_argumentos(args, sys.modules[__name__], input_data)
+    rastreio.ativar_por_argumentos(args)
+    opcoes = {
+        "formatos": [f.strip() for f in args.formatos.split(",") if f.strip()],
+        "performance_top_k": args.performance_top_k,
+        "performance_min_prioridade": args.performance_min_prioridade,
+        "historico": args.historico,
+    }
+    
+    if args.user_ids:
+        from input_data import load_user_ids
+        
+        go_bots_data = obter_dados_gobots()
+        if not go_bots_data:
+            print("[ERRO] Falha ao obter dados da GoBots.")
+        else:
+            resultado = gerar_relatorios_vendedores(load_user_ids(args.user_ids), go_bots_data,
+                                                    max_workers=args.workers, pasta_saida=args.saida,
+                                                    **opcoes)
+            for uid, arquivo in resultado.items():
+                print(f"[INFO] {uid}: {arquivo or 'falhou'}")
+    else:
+        gerar_relatorio_completo(carregar_access_token("token.txt"), pasta_saida=args.saida, **opcoes)
+
+
 if __name__ == "__main__":
-    gerar_relatorio_completo()
\ No newline at end of file
+    cli()
@@ -0,0 +1,274 @@
+import asyncio
+import atexit
+import gzip
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import date, datetime
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+# Gravação/reprodução das chamadas HTTP de uma execução (input_data, campaign_report, pipeline).
+# O arquivo é um JSON lines comprimido com gzip, uma linha por requisição.
+MODOS = ("record", "replay")
+LATENCIAS = ("original", "zero")
+
+# Datas calculadas com datetime.now(): na chave viram a distância em dias até hoje
+# ("hoje-30"), para a gravação continuar valendo em outro dia sem misturar os dias
+# entre si (o historico_ads.py pede um dia por vez, date_from = date_to)
+PARAMETROS_DATA = {"date_from", "date_to", "order.date_created.from", "order.date_created.to"}
+# Cabeçalhos de resposta que vale a pena guardar
+CABECALHOS_GRAVADOS = ("Content-Type", "Retry-After")
+
+
+def vendedor_de(headers):
+    """
+    O token do Mercado Livre termina com o user_id (APP_USR-...-<USER_ID>), tanto o
+    real quanto os marcadores gravados no lugar dos tokens de /ml/all.
+    """
+    token = (headers or {}).get("Authorization", "")
+    sufixo = token.rsplit("-", 1)[-1]
+    return sufixo if sufixo.isdigit() else None
+
+def _data_relativa(valor):
+    try:
+        dia = datetime.strptime(valor[:10], "%Y-%m-%d").date()
+    except ValueError:
+        return valor
+    return f"hoje{(dia - date.today()).days:+d}"
+
+def chave_requisicao(metodo, url, params=None, headers=None):
+    """
+    Método + URL (datas relativas a hoje) + vendedor do token: URLs iguais de
+    vendedores diferentes (ex.: /advertising/advertisers?product_id=PADS) não se misturam.
+    """
+    partes = urlsplit(str(url))
+    query = parse_qsl(partes.query, keep_blank_values=True)
+    if params:
+        query += [(k, str(v)) for k, v in params.items()]
+    query = sorted((k, _data_relativa(v) if k in PARAMETROS_DATA else v) for k, v in query)
+    chave = f"{metodo.upper()} {urlunsplit((partes.scheme, partes.netloc, partes.path, urlencode(query), ''))}"
+    vendedor = vendedor_de(headers)
+    return f"{chave} seller={vendedor}" if vendedor else chave
+
+def _sem_tokens(corpo):
+    """Troca os tokens de /ml/all por marcadores no formato APP_USR-...-<USER_ID>."""
+    try:
+        dados = json.loads(corpo)
+    except ValueError:
+        return corpo
+    if not isinstance(dados, list):
+        return corpo
+    for registro in dados:
+        if isinstance(registro, dict):
+            for campo in list(registro):
+                if "token" in campo:
+                    registro[campo] = f"APP_USR-CASSETTE-0-0-{registro.get('user_id', 0)}"
+    return json.dumps(dados)
+
+
+class Cassette:
+    def __init__(self, caminho, modo="replay", latencia="original"):
+        if modo not in MODOS:
+            raise ValueError(f"Modo de cassette inválido: {modo}")
+        if latencia not in LATENCIAS:
+            raise ValueError(f"Latência de cassette inválida: {latencia}")
+        self.caminho = caminho
+        self.modo = modo
+        self.latencia = latencia
+        self.gravacoes = []
+        self.respostas = defaultdict(deque)
+        self.nao_encontradas = 0
+        self._lock = threading.Lock()
+        if modo == "replay":
+            self._carregar()
+
+    # --- arquivo ---
+    def _carregar(self):
+        with gzip.open(self.caminho, "rt", encoding="utf-8") as f:
+            for linha in f:
+                gravacao = json.loads(linha)
+                self.respostas[gravacao["chave"]].append(gravacao)
+        print(f"[INFO] Cassette {self.caminho}: {sum(map(len, self.respostas.values()))} respostas carregadas")
+
+    def salvar(self):
+        if self.modo != "record":
+            return
+        with self._lock:
+            with gzip.open(self.caminho, "wt", encoding="utf-8") as f:
+                for gravacao in self.gravacoes:
+                    f.write(json.dumps(gravacao, ensure_ascii=False) + "\n")
+        print(f"[INFO] Cassette {self.caminho}: {len(self.gravacoes)} requisições gravadas")
+
+    # --- gravação e busca ---
+    def gravar(self, chave, status, cabecalhos, corpo, latencia):
+        corpo = corpo.decode("utf-8", errors="replace")
+        if chave.endswith("/ml/all"):
+            corpo = _sem_tokens(corpo)
+        gravacao = {
+            "chave": chave,
+            "status": status,
+            "cabecalhos": {c: cabecalhos[c] for c in CABECALHOS_GRAVADOS if c in cabecalhos},
+            "corpo": corpo,
+            "latencia": round(latencia, 4),
+        }
+        with self._lock:
+            self.gravacoes.append(gravacao)
+
+    def buscar(self, chave):
+        """
+        Respostas da mesma chave saem na ordem em que foram gravadas (ex.: um 429
+        e depois o 200 da nova tentativa); esgotadas, a última se repete.
+        """
+        with self._lock:
+            fila = self.respostas.get(chave)
+            if not fila:
+                self.nao_encontradas += 1
+                print(f"[WARN] Cassette sem resposta para {chave}")
+                return {"status": 404, "cabecalhos": {}, "corpo": '{"message": "not in cassette"}', "latencia": 0}
+            return fila.popleft() if len(fila) > 1 else fila[0]
+
+    def espera(self, gravacao):
+        return gravacao["latencia"] if self.latencia == "original" else 0
+
+    # --- adaptadores ---
+    def cliente_requests(self, cliente=requests):
+        return _ClienteRequests(self, cliente)
+
+    def envolver_sessao(self, session):
+        return _SessaoAiohttp(self, session)
+
+
+# ======================================================
+# requests (campaign_report.py)
+# ======================================================
+class _ClienteRequests:
+    def __init__(self, cassette, cliente):
+        self.cassette = cassette
+        self.cliente = cliente
+
+    def get(self, url, headers=None, params=None, **kwargs):
+        chave = chave_requisicao("GET", url, params, headers)
+        if self.cassette.modo == "record":
+            inicio = time.perf_counter()
+            resp = self.cliente.get(url, headers=headers, params=params, **kwargs)
+            self.cassette.gravar(chave, resp.status_code, resp.headers, resp.content, time.perf_counter() - inicio)
+            return resp
+
+        gravacao = self.cassette.buscar(chave)
+        time.sleep(self.cassette.espera(gravacao))
+        resp = requests.Response()
+        resp.status_code = gravacao["status"]
+        resp.headers = CaseInsensitiveDict(gravacao["cabecalhos"])
+        resp._content = gravacao["corpo"].encode("utf-8")
+        resp.encoding = "utf-8"
+        resp.url = url
+        return resp
+
+
+# ======================================================
+# aiohttp (input_data.py / pipeline.py)
+# ======================================================
+class _RespostaGravada:
+    def __init__(self, gravacao):
+        self.status = gravacao["status"]
+        self.headers = CaseInsensitiveDict(gravacao["cabecalhos"])
+        self._corpo = gravacao["corpo"].encode("utf-8")
+
+    async def read(self):
+        return self._corpo
+
+    async def text(self, encoding="utf-8"):
+        return self._corpo.decode(encoding)
+
+    async def json(self, **kwargs):
+        return json.loads(self._corpo)
+
+    def release(self):
+        pass
+
+
+class _Requisicao:
+    def __init__(self, sessao, url, params, kwargs):
+        self.sessao = sessao
+        self.url = url
+        self.params = params
+        self.kwargs = kwargs
+        self._contexto = None
+
+    async def __aenter__(self):
+        cassette = self.sessao.cassette
+        chave = chave_requisicao("GET", self.url, self.params, self.kwargs.get("headers"))
+        if cassette.modo == "record":
+            inicio = time.perf_counter()
+            self._contexto = self.sessao.session.get(self.url, params=self.params, **self.kwargs)
+            resp = await self._contexto.__aenter__()
+            corpo = await resp.read()
+            cassette.gravar(chave, resp.status, resp.headers, corpo, time.perf_counter() - inicio)
+            return resp
+
+        gravacao = cassette.buscar(chave)
+        espera = cassette.espera(gravacao)
+        if espera:
+            await asyncio.sleep(espera)
+        return _RespostaGravada(gravacao)
+
+    async def __aexit__(self, *exc):
+        if self._contexto is not None:
+            return await self._contexto.__aexit__(*exc)
+
+
+class _SessaoAiohttp:
+    """Expõe o get() usado pelos helpers de input_data; o resto vai para a sessão real."""
+    def __init__(self, cassette, session):
+        self.cassette = cassette
+        self.session = session
+
+    def get(self, url, params=None, **kwargs):
+        return _Requisicao(self, url, params, kwargs)
+
+    def __getattr__(self, nome):
+        return getattr(self.session, nome)
+
+    async def __aenter__(self):
+        await self.session.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        return await self.session.__aexit__(*exc)
+
+
+# ======================================================
+# ATIVAÇÃO PELOS SCRIPTS
+# ======================================================
+def adicionar_argumentos(parser):
+    parser.add_argument("--cassette", metavar="ARQUIVO",
+                        help="Grava (--cassette-mode record) ou reproduz as chamadas HTTP deste arquivo .jsonl.gz")
+    parser.add_argument("--cassette-mode", choices=MODOS, default="replay")
+    parser.add_argument("--cassette-latency", choices=LATENCIAS, default="original",
+                        help="Na reprodução, espera a latência gravada ou responde na hora")
+
+def ativar(caminho, modo="replay", latencia="original", modulos=()):
+    """
+    Liga o cassette nos módulos informados: troca campaign_report.cliente_http
+    e input_data.session_wrapper (quando existirem). Na gravação, o arquivo é
+    salvo ao final do processo.
+    """
+    cassette = Cassette(caminho, modo, latencia)
+    for modulo in modulos:
+        if hasattr(modulo, "cliente_http"):
+            modulo.cliente_http = cassette.cliente_requests(modulo.cliente_http)
+        if hasattr(modulo, "session_wrapper"):
+            modulo.session_wrapper = cassette.envolver_sessao
+    if modo == "record":
+        atexit.register(cassette.salvar)
+    return cassette
+
+def ativar_por_argumentos(args, *modulos):
+    if not args.cassette:
+        return None
+    return ativar(args.cassette, args.cassette_mode, args.cassette_latency, modulos)
@@ -0,0 +1,44 @@
+import argparse
+import importlib
+import sys
+
+
+# Subcomando -> (módulo, descrição). O módulo só é importado quando o seu subcomando
+# roda: `cli.py --help` e a escolha do subcomando não carregam pandas, aiohttp,
+# Jinja2 nem Playwright, e cada subcomando só paga pelo que usa.
+COMANDOS = {
+    "collect": ("input_data", "Coleta os dados dos vendedores e grava as tabelas em output_tables/"),
+    "render": ("recommendation_report", "Gera os PDFs de recomendação a partir de output_tables/"),
+    "pipeline": ("pipeline", "Coleta e gera os PDFs no mesmo processo"),
+    "campaign": ("campaign_report", "Relatório de Product Ads por vendedor"),
+    "history": ("historico_ads", "Histórico local de métricas diárias de Product Ads"),
+    "bench": (None, "Benchmarks (pdf: geração de PDFs; api: coleta contra o mock_api.py)"),
+}
+BENCHMARKS = {
+    "pdf": "bench_pdf",
+    "api": "bench_api",
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="cli.py",
+        description="Ponto de entrada único. As opções de cada subcomando: cli.py SUBCOMANDO --help",
+    )
+    subparsers = parser.add_subparsers(dest="comando", metavar="SUBCOMANDO", required=True)
+    for nome, (_, ajuda) in COMANDOS.items():
+        # As opções (e o --help) de cada subcomando ficam com o parser do próprio módulo
+        subparser = subparsers.add_parser(nome, help=ajuda, add_help=False)
+        if nome == "bench":
+            subparser.add_argument("alvo", choices=sorted(BENCHMARKS))
+    args, resto = parser.parse_known_args(argv)
+
+    if args.comando == "bench":
+        modulo, prog = BENCHMARKS[args.alvo], f"cli.py bench {args.alvo}"
+    else:
+        modulo, prog = COMANDOS[args.comando][0], f"cli.py {args.comando}"
+    return importlib.import_module(modulo).cli(resto, prog=prog)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
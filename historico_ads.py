@@ -0,0 +1,318 @@
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import campaign_report
+
+
+# ======================================================
+# 1) CONFIG
+# ======================================================
+# Base local com as métricas diárias de Product Ads (uma linha por campanha/anúncio e dia)
+HISTORICO_DB = "historico_ads.db"
+
+# Os últimos dias são buscados de novo a cada execução (o dia de hoje está incompleto
+# e a atribuição de vendas dos dias anteriores ainda pode mudar)
+DIAS_REVISAO = 2
+
+# Quantos dias são buscados na API ao mesmo tempo
+HISTORICO_WORKERS = 4
+
+# Janelas dos agregados e das tendências
+JANELAS = (7, 30, 90)
+
+# Métricas que podem ser somadas dia a dia
+METRICAS_SOMAVEIS = (
+    "prints", "clicks", "cost",
+    "units_quantity", "direct_units_quantity", "indirect_units_quantity",
+    "direct_items_quantity", "indirect_items_quantity",
+    "organic_units_quantity", "organic_items_quantity", "advertising_items_quantity",
+    "direct_amount", "indirect_amount", "total_amount",
+)
+
+# Atributos (não-métricas) guardados da resposta mais recente de cada campanha/anúncio
+ATRIBUTOS_CAMPANHA = ("id", "name", "status", "budget", "currency_id", "strategy", "acos_target", "channel")
+ATRIBUTOS_ANUNCIO = ("item_id", "campaign_id", "title", "status", "channel", "date_created",
+                     "listing_type_id", "buy_box_winner")
+
+_COLUNAS_METRICAS = ", ".join(
+    f"{m} {'REAL' if m == 'cost' or m.endswith('_amount') else 'INTEGER'}" for m in METRICAS_SOMAVEIS
+)
+ESQUEMA = f"""
+CREATE TABLE IF NOT EXISTS campanhas_diario (
+    advertiser_id INTEGER NOT NULL,
+    campaign_id   INTEGER NOT NULL,
+    dia           TEXT NOT NULL,
+    {_COLUNAS_METRICAS},
+    sov REAL,
+    PRIMARY KEY (advertiser_id, campaign_id, dia)
+);
+CREATE TABLE IF NOT EXISTS anuncios_diario (
+    advertiser_id INTEGER NOT NULL,
+    item_id       TEXT NOT NULL,
+    dia           TEXT NOT NULL,
+    {_COLUNAS_METRICAS},
+    sov REAL,
+    PRIMARY KEY (advertiser_id, item_id, dia)
+);
+CREATE TABLE IF NOT EXISTS campanhas (
+    advertiser_id INTEGER NOT NULL,
+    campaign_id   INTEGER NOT NULL,
+    atributos     TEXT NOT NULL,
+    PRIMARY KEY (advertiser_id, campaign_id)
+);
+CREATE TABLE IF NOT EXISTS anuncios (
+    advertiser_id INTEGER NOT NULL,
+    item_id       TEXT NOT NULL,
+    atributos     TEXT NOT NULL,
+    PRIMARY KEY (advertiser_id, item_id)
+);
+-- Dias já buscados, inclusive os que não tiveram nenhuma linha
+CREATE TABLE IF NOT EXISTS dias_carregados (
+    advertiser_id INTEGER NOT NULL,
+    dia           TEXT NOT NULL,
+    carregado_em  TEXT NOT NULL,
+    PRIMARY KEY (advertiser_id, dia)
+);
+"""
+
+def conectar(caminho=HISTORICO_DB):
+    # Vários vendedores podem gravar na mesma base ao mesmo tempo (gerar_relatorios_vendedores)
+    conn = sqlite3.connect(caminho, timeout=30)
+    conn.executescript(ESQUEMA)
+    return conn
+
+
+# ======================================================
+# 2) BUSCA INCREMENTAL (SÓ OS DIAS QUE FALTAM)
+# ======================================================
+def _dias(date_from, date_to):
+    inicio = datetime.strptime(date_from, campaign_report.DATE_FORMAT)
+    fim = datetime.strptime(date_to, campaign_report.DATE_FORMAT)
+    return [(inicio + timedelta(days=n)).strftime(campaign_report.DATE_FORMAT) for n in range((fim - inicio).days + 1)]
+
+def dias_faltantes(conn, advertiser_id, date_from, date_to, hoje=None):
+    hoje = hoje or datetime.now().strftime(campaign_report.DATE_FORMAT)
+    revisar_desde = (datetime.strptime(hoje, campaign_report.DATE_FORMAT)
+                     - timedelta(days=DIAS_REVISAO)).strftime(campaign_report.DATE_FORMAT)
+    carregados = {dia for (dia,) in conn.execute(
+        "SELECT dia FROM dias_carregados WHERE advertiser_id = ? AND dia BETWEEN ? AND ?",
+        (advertiser_id, date_from, date_to),
+    )}
+    return [d for d in _dias(date_from, min(date_to, hoje)) if d not in carregados or d >= revisar_desde]
+
+def _buscar_dia(relatorio, headers, advertiser_id, dia):
+    campanhas = relatorio.listar_campanhas_advertiser(headers, advertiser_id, dia, dia)
+    anuncios = relatorio.listar_product_ads_items(headers, advertiser_id, dia, dia)
+    return dia, campanhas, anuncios
+
+def _linha_metricas(metrics):
+    return [metrics.get(m, 0) or 0 for m in METRICAS_SOMAVEIS] + [metrics.get("sov")]
+
+def _gravar_dia(conn, advertiser_id, dia, campanhas, anuncios):
+    placeholders = ", ".join("?" * (len(METRICAS_SOMAVEIS) + 4))
+    colunas = ", ".join(METRICAS_SOMAVEIS) + ", sov"
+    with conn:
+        conn.execute("DELETE FROM campanhas_diario WHERE advertiser_id = ? AND dia = ?", (advertiser_id, dia))
+        conn.execute("DELETE FROM anuncios_diario WHERE advertiser_id = ? AND dia = ?", (advertiser_id, dia))
+        conn.executemany(
+            f"INSERT INTO campanhas_diario (advertiser_id, campaign_id, dia, {colunas}) VALUES ({placeholders})",
+            [[advertiser_id, c.get("id"), dia] + _linha_metricas(c.get("metrics", {})) for c in campanhas],
+        )
+        conn.executemany(
+            f"INSERT INTO anuncios_diario (advertiser_id, item_id, dia, {colunas}) VALUES ({placeholders})",
+            [[advertiser_id, a.get("item_id"), dia] + _linha_metricas(a.get("metrics", {})) for a in anuncios],
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO campanhas (advertiser_id, campaign_id, atributos) VALUES (?, ?, ?)",
+            [(advertiser_id, c.get("id"), json.dumps({k: c.get(k) for k in ATRIBUTOS_CAMPANHA})) for c in campanhas],
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO anuncios (advertiser_id, item_id, atributos) VALUES (?, ?, ?)",
+            [(advertiser_id, a.get("item_id"), json.dumps({k: a.get(k) for k in ATRIBUTOS_ANUNCIO})) for a in anuncios],
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO dias_carregados (advertiser_id, dia, carregado_em) VALUES (?, ?, ?)",
+            (advertiser_id, dia, datetime.now().isoformat(timespec="seconds")),
+        )
+
+def sincronizar(conn, headers, advertiser_id, date_from, date_to, max_workers=HISTORICO_WORKERS,
+                relatorio=campaign_report):
+    """
+    Busca na API (um dia por vez, date_from = date_to) só os dias do período que
+    ainda não estão na base, além de hoje e dos DIAS_REVISAO dias anteriores.
+    As listagens são as de `relatorio`: o módulo campaign_report que está rodando
+    (que pode ser o __main__, com cassette/métricas ligados). Retorna os dias buscados.
+    """
+    faltantes = dias_faltantes(conn, advertiser_id, date_from, date_to)
+    print(f"[INFO] Histórico de Ads: {len(faltantes)} dia(s) a buscar entre {date_from} e {date_to}.")
+    if not faltantes:
+        return []
+
+    # As threads só fazem as chamadas; a gravação fica na thread da conexão
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for dia, campanhas, anuncios in executor.map(lambda d: _buscar_dia(relatorio, headers, advertiser_id, d), faltantes):
+            _gravar_dia(conn, advertiser_id, dia, campanhas, anuncios)
+    return faltantes
+
+
+# ======================================================
+# 3) AGREGADOS EM SQL
+# ======================================================
+# Razões recalculadas a partir das somas (mesma convenção da API: ctr, acos e cvr em %)
+RAZOES_SQL = """
+    CASE WHEN SUM(prints) > 0 THEN 100.0 * SUM(clicks) / SUM(prints) ELSE 0 END AS ctr,
+    CASE WHEN SUM(clicks) > 0 THEN SUM(cost) / SUM(clicks) ELSE 0 END AS cpc,
+    CASE WHEN SUM(total_amount) > 0 THEN 100.0 * SUM(cost) / SUM(total_amount) ELSE 0 END AS acos,
+    CASE WHEN SUM(clicks) > 0 THEN 100.0 * SUM(units_quantity) / SUM(clicks) ELSE 0 END AS cvr,
+    CASE WHEN SUM(cost) > 0 THEN SUM(total_amount) / SUM(cost) ELSE 0 END AS roas,
+    AVG(sov) AS sov
+"""
+SOMAS_SQL = ", ".join(f"SUM({m}) AS {m}" for m in METRICAS_SOMAVEIS)
+
+def _metricas_do_periodo(conn, tabela, chave, advertiser_id, date_from, date_to):
+    consulta = f"""
+        SELECT {chave}, {SOMAS_SQL}, {RAZOES_SQL}
+        FROM {tabela}
+        WHERE advertiser_id = ? AND dia BETWEEN ? AND ?
+        GROUP BY {chave}
+    """
+    cursor = conn.execute(consulta, (advertiser_id, date_from, date_to))
+    nomes = [d[0] for d in cursor.description]
+    return {linha[0]: dict(zip(nomes[1:], linha[1:])) for linha in cursor}
+
+def _atributos(conn, tabela, chave, advertiser_id):
+    return {k: json.loads(a) for k, a in conn.execute(
+        f"SELECT {chave}, atributos FROM {tabela} WHERE advertiser_id = ?", (advertiser_id,))}
+
+def campanhas_e_anuncios_do_periodo(caminho_db, headers, advertiser_id, date_from, date_to,
+                                    relatorio=campaign_report):
+    """
+    Substitui listar_campanhas_advertiser/listar_product_ads_items no relatório:
+    sincroniza os dias que faltam e devolve (campanhas, anuncios) no mesmo formato
+    da API ({..., "metrics": {...}}), com as métricas somadas no período.
+    """
+    conn = conectar(caminho_db)
+    try:
+        sincronizar(conn, headers, advertiser_id, date_from, date_to, relatorio=relatorio)
+        resultado = []
+        for tabela_dia, tabela_attr, chave in (("campanhas_diario", "campanhas", "campaign_id"),
+                                               ("anuncios_diario", "anuncios", "item_id")):
+            metricas = _metricas_do_periodo(conn, tabela_dia, chave, advertiser_id, date_from, date_to)
+            atributos = _atributos(conn, tabela_attr, chave, advertiser_id)
+            resultado.append([dict(atributos.get(k, {}), metrics=m) for k, m in metricas.items()])
+        return resultado[0], resultado[1]
+    finally:
+        conn.close()
+
+def resumo_janelas(conn, advertiser_id, tipo="campanhas", ate=None, janelas=JANELAS):
+    """
+    Uma linha por campanha (ou anúncio) com clicks, custo, receita e ACOS nas
+    janelas de 7/30/90 dias terminadas em `ate` (padrão: ontem), numa única consulta.
+    """
+    ate = ate or (datetime.now() - timedelta(days=1)).strftime(campaign_report.DATE_FORMAT)
+    tabela, chave = ("campanhas_diario", "campaign_id") if tipo == "campanhas" else ("anuncios_diario", "item_id")
+    fim = datetime.strptime(ate, campaign_report.DATE_FORMAT)
+    inicios = {j: (fim - timedelta(days=j - 1)).strftime(campaign_report.DATE_FORMAT) for j in janelas}
+
+    colunas = []
+    for j in janelas:
+        filtro = f"CASE WHEN dia >= :inicio_{j} THEN {{}} END"
+        colunas += [
+            f"SUM({filtro.format('clicks')}) AS clicks_{j}d",
+            f"SUM({filtro.format('cost')}) AS cost_{j}d",
+            f"SUM({filtro.format('total_amount')}) AS total_amount_{j}d",
+            f"SUM({filtro.format('units_quantity')}) AS units_{j}d",
+            f"100.0 * SUM({filtro.format('cost')}) / NULLIF(SUM({filtro.format('total_amount')}), 0) AS acos_{j}d",
+        ]
+    consulta = f"""
+        SELECT {chave}, {', '.join(colunas)}
+        FROM {tabela}
+        WHERE advertiser_id = :adv AND dia BETWEEN :inicio_max AND :ate
+        GROUP BY {chave}
+        ORDER BY cost_{max(janelas)}d DESC
+    """
+    params = {"adv": advertiser_id, "ate": ate, "inicio_max": inicios[max(janelas)]}
+    params.update({f"inicio_{j}": inicio for j, inicio in inicios.items()})
+    return pd.read_sql_query(consulta, conn, params=params)
+
+def tendencia(conn, advertiser_id, tipo="campanhas", dias=7, ate=None):
+    """
+    Compara os últimos `dias` com os `dias` anteriores: clicks, custo, receita e
+    ACOS de cada período e a variação percentual.
+    """
+    ate = ate or (datetime.now() - timedelta(days=1)).strftime(campaign_report.DATE_FORMAT)
+    tabela, chave = ("campanhas_diario", "campaign_id") if tipo == "campanhas" else ("anuncios_diario", "item_id")
+    fim = datetime.strptime(ate, campaign_report.DATE_FORMAT)
+    inicio_atual = (fim - timedelta(days=dias - 1)).strftime(campaign_report.DATE_FORMAT)
+    inicio_anterior = (fim - timedelta(days=2 * dias - 1)).strftime(campaign_report.DATE_FORMAT)
+    consulta = f"""
+        WITH periodos AS (
+            SELECT {chave},
+                   SUM(CASE WHEN dia >= :inicio_atual THEN clicks END) AS clicks_atual,
+                   SUM(CASE WHEN dia <  :inicio_atual THEN clicks END) AS clicks_anterior,
+                   SUM(CASE WHEN dia >= :inicio_atual THEN cost END) AS cost_atual,
+                   SUM(CASE WHEN dia <  :inicio_atual THEN cost END) AS cost_anterior,
+                   SUM(CASE WHEN dia >= :inicio_atual THEN total_amount END) AS total_amount_atual,
+                   SUM(CASE WHEN dia <  :inicio_atual THEN total_amount END) AS total_amount_anterior
+            FROM {tabela}
+            WHERE advertiser_id = :adv AND dia BETWEEN :inicio_anterior AND :ate
+            GROUP BY {chave}
+        )
+        SELECT *,
+               100.0 * cost_atual / NULLIF(total_amount_atual, 0) AS acos_atual,
+               100.0 * cost_anterior / NULLIF(total_amount_anterior, 0) AS acos_anterior,
+               100.0 * (clicks_atual - clicks_anterior) / NULLIF(clicks_anterior, 0) AS var_clicks_pct,
+               100.0 * (cost_atual - cost_anterior) / NULLIF(cost_anterior, 0) AS var_cost_pct,
+               100.0 * (total_amount_atual - total_amount_anterior) / NULLIF(total_amount_anterior, 0) AS var_total_amount_pct
+        FROM periodos
+        ORDER BY cost_atual DESC
+    """
+    return pd.read_sql_query(consulta, conn, params={
+        "adv": advertiser_id, "ate": ate, "inicio_atual": inicio_atual, "inicio_anterior": inicio_anterior,
+    })
+
+
+# ======================================================
+# 4) EXECUÇÃO
+# ======================================================
+def cli(argv=None, prog=None):
+    import argparse
+
+    import cassette
+    import metricas_http
+
+    parser = argparse.ArgumentParser(
+        prog=prog, description="Histórico local de métricas diárias de Product Ads"
+    )
+    parser.add_argument("--db", default=HISTORICO_DB)
+    parser.add_argument("--token", default="token.txt", help="Arquivo com o access token do vendedor")
+    parser.add_argument("--dias", type=int, default=max(JANELAS), help="Quantos dias manter sincronizados")
+    parser.add_argument("--tipo", choices=("campanhas", "anuncios"), default="campanhas")
+    parser.add_argument("--sem-sincronizar", action="store_true", help="Só consulta a base, sem chamar a API")
+    cassette.adicionar_argumentos(parser)
+    metricas_http.adicionar_argumentos(parser)
+    args = parser.parse_args(argv)
+    # Ao reproduzir um cassette, use uma base nova (--db): dias que já estão na base
+    # não são pedidos e a execução não segue as requisições que foram gravadas
+    cassette.ativar_por_argumentos(args, campaign_report)
+    metricas_http.ativar_por_argumentos(args, campaign_report)
+
+    headers = campaign_report.montar_headers(campaign_report.carregar_access_token(args.token))
+    advertiser_id = campaign_report.obter_advertiser_id_pads(headers)
+    conn = conectar(args.db)
+    if not args.sem_sincronizar:
+        sincronizar(conn, headers, advertiser_id, *campaign_report.periodo_padrao(args.dias))
+
+    pd.set_option("display.width", 200)
+    print(resumo_janelas(conn, advertiser_id, args.tipo).to_string(index=False))
+    print()
+    print(tendencia(conn, advertiser_id, args.tipo).to_string(index=False))
+    conn.close()
+
+
+if __name__ == "__main__":
+    cli()
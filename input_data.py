@@ -1,15 +1,37 @@
 import asyncio
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from datetime import datetime, timedelta
+import json
 import os
+import time
 
 import aiohttp
 import pandas as pd
 
+import rastreio
+
+# Decodificador de JSON: usa orjson quando instalado (bem mais rápido em páginas grandes)
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
 
 # ======================================================
 # 1) AUTENTICAÇÃO & CONFIG
 # ======================================================
+# Endereços das APIs: lidos das variáveis ML_API_URL/GOBOTS_API_URL a cada chamada.
+# Um valor atribuído aqui tem precedência (ex.: bench_api.py aponta para o mock_api.py local)
+ML_API_URL = None
+GOBOTS_API_URL = None
+
+def ml_api_url():
+    return ML_API_URL or os.environ.get('ML_API_URL', 'https://api.mercadolibre.com')
+
+def gobots_api_url():
+    return GOBOTS_API_URL or os.environ.get('GOBOTS_API_URL', 'https://askhere.gobots.com.br')
+
 def load_access_token(caminho_arquivo="token.txt"):
     """
     Lê o token de um arquivo externo e retorna como string.
@@ -19,7 +41,7 @@ def load_access_token(caminho_arquivo="token.txt"):
     return token
 
 async def get_go_bots_api_response(session):
-    url = 'https://askhere.gobots.com.br/ml/all'
+    url = f'{gobots_api_url()}/ml/all'
     access_token = load_access_token('gobots_token.txt')
     headers = {'Authorization': f'Bearer {access_token}'}
     async with session.get(url, headers=headers) as response:
@@ -34,13 +56,145 @@ def get_access_token_from_gobots_api(user_id, data):
     return None
     
 
+# ======================================================
+# 1.1) CONTROLE ADAPTATIVO DE CONCORRÊNCIA (AIMD)
+# ======================================================
+class AdaptiveLimiter:
+    """
+    Limits how many API requests are in flight at once and adapts the limit
+    AIMD-style: it grows additively (about +1 per `limit` healthy responses)
+    and is cut multiplicatively on 429/5xx or when a response takes more than
+    `spike_factor` times the running average latency.
+
+    create_session(limiter) wraps the session with LimitedSession, so every
+    request made with it (process_item, build_output...) waits for a slot
+    before aiohttp starts the request and its timeout.
+    """
+    def __init__(self, initial_limit=20, min_limit=1, max_limit=200,
+                 decrease_factor=0.5, spike_factor=3.0, latency_alpha=0.1):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.spike_factor = spike_factor
+        self.latency_alpha = latency_alpha
+        self.avg_latency = None
+        self.in_flight = 0
+        self.history = [(0.0, self.current_limit)]
+        self._started = time.monotonic()
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    @property
+    def current_limit(self):
+        return int(self.limit)
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.current_limit)
+            self.in_flight += 1
+
+    async def release(self, status, latency):
+        async with self._condition:
+            self.in_flight -= 1
+            self._update(status, latency)
+            self._condition.notify_all()
+
+    def _update(self, status, latency):
+        before = self.current_limit
+        now = time.monotonic()
+        overloaded = status is None or status == 429 or status >= 500
+        spike = (self.avg_latency is not None and latency is not None
+                 and latency > self.spike_factor * self.avg_latency)
+
+        if overloaded or spike:
+            # At most one cut per average round trip, so a burst of 429s counts once
+            if now - self._last_decrease >= (self.avg_latency or 0):
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                self._last_decrease = now
+        else:
+            self.limit = min(self.max_limit, self.limit + 1.0 / max(self.limit, 1.0))
+
+        if latency is not None and not overloaded:
+            if self.avg_latency is None:
+                self.avg_latency = latency
+            else:
+                self.avg_latency += self.latency_alpha * (latency - self.avg_latency)
+
+        if self.current_limit != before:
+            self.history.append((round(now - self._started, 3), self.current_limit))
+
+
+class _LimitedRequest:
+    def __init__(self, limiter, request):
+        self.limiter = limiter
+        self.request = request
+
+    async def __aenter__(self):
+        # The slot is taken before session.get() starts: time spent queued here
+        # doesn't count against the request's ClientTimeout
+        await self.limiter.acquire()
+        start = time.monotonic()
+        try:
+            response = await self.request.__aenter__()
+        except BaseException:
+            await self.limiter.release(None, time.monotonic() - start)
+            raise
+        # Released once the response headers arrive, like the request end in aiohttp
+        await self.limiter.release(response.status, time.monotonic() - start)
+        return response
+
+    async def __aexit__(self, *exc):
+        return await self.request.__aexit__(*exc)
+
+
+class LimitedSession:
+    """Exposes the get() used by the helpers below, gated by an AdaptiveLimiter."""
+    def __init__(self, limiter, session):
+        self.limiter = limiter
+        self.session = session
+
+    def get(self, url, **kwargs):
+        return _LimitedRequest(self.limiter, self.session.get(url, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    async def __aenter__(self):
+        await self.session.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        return await self.session.__aexit__(*exc)
+
+# Quando definido, envolve toda sessão criada abaixo (usado pelo cassette.py para gravar/reproduzir)
+session_wrapper = None
+
+def create_session(limiter=None):
+    session = aiohttp.ClientSession()
+    if session_wrapper:
+        session = session_wrapper(session)
+    # O limitador fica por fora: o tempo na fila dele não entra na latência medida pelo metricas_http.py
+    if limiter:
+        session = LimitedSession(limiter, session)
+    return session
+
+
 # ======================================================
 # 2) OBTER VISITAS, VENDAS E PREÇO POR PRODUTO
 # ======================================================
 
+# Lê o corpo da resposta com o decodificador configurado acima
+async def read_json(response):
+    return json_loads(await response.read())
+
+# Extrai só o id do item de cada pedido de uma página do /orders/search
+def extract_order_item_ids(data):
+    return [order["order_items"][0]["item"]["id"] for order in data.get('results', ())]
+
 # Função para obter as os itens de um vendedor através da API de orders
 async def get_all_items_with_sales(session, date_from, date_to, user_id, access_token):
-    url = 'https://api.mercadolibre.com/orders/search'
+    url = f'{ml_api_url()}/orders/search'
     headers = {'Authorization': f'Bearer {access_token}'}
     params = {
         'seller': user_id,
@@ -50,7 +204,6 @@ async def get_all_items_with_sales(session, date_from, date_to, user_id, access_
         'limit': 50,
 
     }
-    all_items = []
     item_sales = defaultdict(int)
     offset = 0
 
@@ -61,12 +214,8 @@ async def get_all_items_with_sales(session, date_from, date_to, user_id, access_
                 print(f"Erro na requisição: {response.status}, user id: {user_id}")
                 break
             
-            data = await response.json()
-            results = data.get('results', [])
-            for order in results:
-                item_id = order["order_items"][0]["item"]["id"]
-                if item_id not in all_items:
-                    all_items.append(item_id)
+            data = await read_json(response)
+            for item_id in extract_order_item_ids(data):
                 item_sales[item_id] += 1
 
             paging = data.get('paging', {})
@@ -89,7 +238,7 @@ async def get_all_items_with_sales(session, date_from, date_to, user_id, access_
 
 # Função para obter as visitas de um item
 async def get_item_visits(session, item_id, date_from, date_to, access_token):
-    url = f'https://api.mercadolibre.com/items/{item_id}/visits'
+    url = f'{ml_api_url()}/items/{item_id}/visits'
     headers = {'Authorization': f'Bearer {access_token}'}
     params = {'date_from': date_from, 'date_to': date_to}
     async with session.get(url, headers=headers, params=params) as response:
@@ -98,38 +247,46 @@ async def get_item_visits(session, item_id, date_from, date_to, access_token):
             return data.get('total_visits')
         return None
 
+# Campos pedidos ao /items (projeção), suficientes para montar os detalhes abaixo
+ITEM_DETAIL_FIELDS = 'id,title,price,permalink,pictures,available_quantity,initial_quantity,variations'
+
+# Detalhes de um item guardados como tupla (bem menor que o dict da API)
+ItemDetails = namedtuple('ItemDetails', ['title', 'price', 'permalink', 'image_url', 'stock'])
+
+def extract_item_details(item_data):
+    stock = None
+    if "available_quantity" in item_data:
+        stock = item_data["available_quantity"]
+    elif "initial_quantity" in item_data:
+        stock = item_data["initial_quantity"]
+    elif item_data.get("variations"):
+        stock = sum(var.get("available_quantity", 0) for var in item_data["variations"])
+    return ItemDetails(
+        item_data.get('title'),
+        item_data.get('price'),
+        item_data.get('permalink'),
+        item_data["pictures"][0]["secure_url"] if item_data.get("pictures") else None,
+        stock,
+    )
+
 async def get_batch_item_details(session, item_ids, access_token):
-    url = 'https://api.mercadolibre.com/items'
-    params = {'ids': ','.join(item_ids)}
+    url = f'{ml_api_url()}/items'
+    params = {'ids': ','.join(item_ids), 'attributes': ITEM_DETAIL_FIELDS}
     headers = {'Authorization': f'Bearer {access_token}'}
     async with session.get(url, headers=headers, params=params) as response:
         if response.status != 200:
             return {}
-        data = await response.json()
+        data = await read_json(response)
         details = {}
         for item in data:
             if item.get('code') == 200:
                 item_data = item.get('body', {})
-                item_id = item_data.get('id')
-                stock = None
-                if "available_quantity" in item_data:
-                    stock = item_data["available_quantity"]
-                elif "initial_quantity" in item_data:
-                    stock = item_data["initial_quantity"]
-                elif item_data.get("variations"):
-                    stock = sum(var.get("available_quantity", 0) for var in item_data["variations"])
-                details[item_id] = {
-                    'title': item_data.get('title'),
-                    'price': item_data.get('price'),
-                    'permalink': item_data.get('permalink'),
-                    'image_url': item_data["pictures"][0]["secure_url"] if item_data.get("pictures") else None,
-                    'stock': stock,
-                }
+                details[item_data.get('id')] = extract_item_details(item_data)
         return details
 
 # Função para obter score de qualidade do item
 async def get_item_quality_score(session, item_id, access_token):
-    url = f'https://api.mercadolibre.com/item/{item_id}/performance'
+    url = f'{ml_api_url()}/item/{item_id}/performance'
     headers = {'Authorization': f'Bearer {access_token}'}
     async with session.get(url, headers=headers) as response:
         if response.status == 200:
@@ -139,7 +296,7 @@ async def get_item_quality_score(session, item_id, access_token):
 
 #Obter posicionamento do item
 async def get_item_position(session, item_id, access_token):
-    url = f"https://api.mercadolibre.com/highlights/MLB/item/{item_id}"
+    url = f"{ml_api_url()}/highlights/MLB/item/{item_id}"
     headers = {'Authorization': f'Bearer {access_token}'}
     async with session.get(url, headers=headers) as response:
         if response.status == 200:
@@ -149,7 +306,7 @@ async def get_item_position(session, item_id, access_token):
 
 #Obter informações da loja
 async def get_store_info(session, user_id, access_token):
-    url = f'https://api.mercadolibre.com/users/{user_id}'
+    url = f'{ml_api_url()}/users/{user_id}'
     headers = {'Authorization': f'Bearer {access_token}'}
     async with session.get(url, headers=headers) as response:
         if response.status == 200:
@@ -160,6 +317,87 @@ async def get_store_info(session, user_id, access_token):
             }
         return None
 
+# Quantos vendedores vão em cada consulta em lote ao /users
+STORE_INFO_BATCH_SIZE = 20
+# Cache em disco de nickname/permalink (mudam raramente, mas mudam: o vendedor pode renomear a loja)
+STORE_INFO_CACHE_FILE = os.path.join('output_tables', 'store_info_cache.json')
+# Entradas mais velhas que isso são consultadas de novo (nos mesmos lotes do /users)
+STORE_INFO_CACHE_TTL = 24 * 3600
+
+def load_store_info_cache(path=STORE_INFO_CACHE_FILE):
+    try:
+        with open(path, 'rb') as f:
+            return {int(uid): info for uid, info in json_loads(f.read()).items()}
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_store_info_cache(cache, path=STORE_INFO_CACHE_FILE):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({str(uid): info for uid, info in cache.items()}, indent=2, sort_keys=True))
+    os.replace(tmp_path, path)
+
+async def get_batch_store_info(session, user_ids, access_token):
+    url = f'{ml_api_url()}/users'
+    params = {'ids': ','.join(str(uid) for uid in user_ids)}
+    headers = {'Authorization': f'Bearer {access_token}'}
+    async with session.get(url, headers=headers, params=params) as response:
+        if response.status != 200:
+            return {}
+        data = await read_json(response)
+        stores = {}
+        for user in data:
+            if user.get('code') == 200:
+                body = user.get('body', {})
+                stores[body.get('id')] = {
+                    'store_name': body.get('nickname'),
+                    'store_permalink': body.get('permalink')
+                }
+        return stores
+
+async def prefetch_store_info(session, user_ids, go_bots_data, cache=None):
+    """
+    Resolve nickname/permalink de todos os vendedores antes da coleta, com
+    consultas em lote ao /users. Quem está no cache há menos de STORE_INFO_CACHE_TTL
+    não é consultado de novo; quem o lote não devolver é buscado individualmente
+    com o próprio token.
+    """
+    store_infos = dict(cache or {})
+    # Entradas sem 'fetched_at' (cache antigo) ou vencidas também são consultadas;
+    # se a consulta falhar, a entrada antiga continua valendo
+    now = time.time()
+    missing = [uid for uid in user_ids
+               if now - store_infos.get(uid, {}).get('fetched_at', 0) > STORE_INFO_CACHE_TTL]
+    from_cache = len(user_ids) - len(missing)
+    tokens = {uid: get_access_token_from_gobots_api(uid, go_bots_data) for uid in missing}
+    missing = [uid for uid in missing if tokens[uid]]
+    fetched = {}
+
+    batches = [missing[i:i+STORE_INFO_BATCH_SIZE] for i in range(0, len(missing), STORE_INFO_BATCH_SIZE)]
+    results = await asyncio.gather(
+        *(get_batch_store_info(session, batch, tokens[batch[0]]) for batch in batches),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, dict):
+            fetched.update(result)
+
+    leftovers = [uid for uid in missing if uid not in fetched]
+    singles = await asyncio.gather(
+        *(get_store_info(session, uid, tokens[uid]) for uid in leftovers),
+        return_exceptions=True,
+    )
+    for uid, info in zip(leftovers, singles):
+        if isinstance(info, dict):
+            fetched[uid] = info
+
+    for uid, info in fetched.items():
+        store_infos[uid] = dict(info, fetched_at=now)
+
+    print(f"[INFO] Store info: {from_cache} from cache, "
+          f"{len(fetched)} fetched, {len(batches)} bulk requests")
+    return store_infos
+
 async def process_item(session, item_id, date_from, date_to, access_token, store_info, sales, details):
     visits, quality_score, position = await asyncio.gather(
         get_item_visits(session, item_id, date_from, date_to, access_token),
@@ -172,27 +410,30 @@ async def process_item(session, item_id, date_from, date_to, access_token, store
             'store_name': store_info['store_name'],
             'store_permalink': store_info['store_permalink'],
             'item_id': item_id,
-            'title': details['title'],
-            'price': details['price'],
-            'permalink': details['permalink'],
+            'title': details.title,
+            'price': details.price,
+            'permalink': details.permalink,
             'visits': visits,
             'sales': sales,
             'quality_score': quality_score,
-            'stock': details['stock'],
-            'image_url': details['image_url'],
+            'stock': details.stock,
+            'image_url': details.image_url,
             'position': position
         }
     return None
 
-async def build_output(session, user_id, access_token, days_window):
+async def build_output(session, user_id, access_token, days_window, store_info=None):
     # Definir período (último mês)
     end_date = datetime.now()
     start_date = end_date - timedelta(days=days_window)
     date_from = start_date.strftime('%Y-%m-%dT%H:%M:%S.000-00:00')
     date_to = end_date.strftime('%Y-%m-%dT%H:%M:%S.000-00:00')
 
-    items = await get_all_items_with_sales(session, date_from, date_to, user_id, access_token)
-    store_info = await get_store_info(session, user_id, access_token)
+    with rastreio.span('orders_scan', seller=user_id):
+        items = await get_all_items_with_sales(session, date_from, date_to, user_id, access_token)
+    if store_info is None:
+        with rastreio.span('store_info', seller=user_id):
+            store_info = await get_store_info(session, user_id, access_token)
     
     if not items or not store_info:
         return pd.DataFrame()
@@ -200,9 +441,10 @@ async def build_output(session, user_id, access_token, days_window):
     item_ids = [item["item_id"] for item in items]
     details_dict = {}
     max_batch_size = 20
-    for i in range(0, len(item_ids), max_batch_size):
-        batch_ids = item_ids[i:i+max_batch_size]
-        details_dict.update(await get_batch_item_details(session, batch_ids, access_token))
+    with rastreio.span('item_details', seller=user_id, items=len(item_ids)):
+        for i in range(0, len(item_ids), max_batch_size):
+            batch_ids = item_ids[i:i+max_batch_size]
+            details_dict.update(await get_batch_item_details(session, batch_ids, access_token))
 
     tasks = [
         process_item(session, item["item_id"], date_from, date_to, 
@@ -210,7 +452,8 @@ async def build_output(session, user_id, access_token, days_window):
                      details_dict.get(item["item_id"]))
         for item in items
     ]
-    results = await asyncio.gather(*tasks)
+    with rastreio.span('enrichment', seller=user_id, items=len(items)):
+        results = await asyncio.gather(*tasks)
     valid_results = [res for res in results if res is not None]
     
     return pd.DataFrame(valid_results)
@@ -248,37 +491,74 @@ def calculate_metrics(df):
     df_sorted = df_sorted.drop(columns=['cumulative_pct'])
     return df_sorted
 
-async def process_user(session, user_id, go_bots_data):
+async def process_user(session, user_id, go_bots_data, save_csv=True, store_infos=None):
     access_token = get_access_token_from_gobots_api(user_id, go_bots_data)
     if not access_token:
         print(f"No access token for user {user_id}")
-        return
+        return None
 
-    df = await build_output(session, user_id, access_token, 30)
+    store_info = store_infos.get(user_id) if store_infos else None
+    with rastreio.span('collect_seller', seller=user_id):
+        df = await build_output(session, user_id, access_token, 30, store_info=store_info)
     if df.shape[0] > 0:
-        df = calculate_metrics(df)
+        with rastreio.span('metrics', seller=user_id):
+            df = calculate_metrics(df)
         store_name = df['store_name'].iloc[0]
         df['quality_score'] = df['quality_score'].astype('Int64')
         df['position'] = df['position'].astype('Int64')
-        df.to_csv(f'output_tables/{store_name}_{user_id}.csv', index=False)
+        if save_csv:
+            with rastreio.span('save_csv', seller=user_id):
+                df.to_csv(f'output_tables/{store_name}_{user_id}.csv', index=False)
         print(f"Processed user {user_id}")
+        return df
     else:
         print(f"No data for user {user_id}")
+        return None
+
+def load_user_ids(caminho_arquivo='user_ids.txt'):
+    with open(caminho_arquivo, 'r') as f:
+        return [int(uid.strip()) for uid in f.read().split(',')]
 
 async def main():
     os.makedirs('output_tables', exist_ok=True)
 
-    with open('user_ids.txt', 'r') as f:
-        user_ids = [int(uid.strip()) for uid in f.read().split(',')]
+    user_ids = load_user_ids()
 
-    async with aiohttp.ClientSession() as session:
+    limiter = AdaptiveLimiter()
+    async with create_session(limiter) as session:
         go_bots_data = await get_go_bots_api_response(session)
         if not go_bots_data:
             print("Failed to fetch GoBots data")
             return
         
-        tasks = [process_user(session, uid, go_bots_data) for uid in user_ids]
+        with rastreio.span('store_info_prefetch', sellers=len(user_ids)):
+            store_infos = await prefetch_store_info(session, user_ids, go_bots_data, load_store_info_cache())
+        save_store_info_cache(store_infos)
+
+        tasks = [process_user(session, uid, go_bots_data, store_infos=store_infos) for uid in user_ids]
         await asyncio.gather(*tasks)
 
-if __name__ == "__main__":
+    print(f"Final concurrency limit: {limiter.current_limit} (changes: {limiter.history})")
+
+def cli(argv=None, prog=None):
+    import argparse
+    import sys
+
+    import cassette
+    import metricas_http
+
+    parser = argparse.ArgumentParser(
+        prog=prog, description='Coleta os dados dos vendedores e grava as tabelas em output_tables/'
+    )
+    cassette.adicionar_argumentos(parser)
+    metricas_http.adicionar_argumentos(parser)
+    rastreio.adicionar_argumentos(parser)
+    args = parser.parse_args(argv)
+    cassette.ativar_por_argumentos(args, sys.modules[__name__])
+    metricas_http.ativar_por_argumentos(args, sys.modules[__name__])
+    rastreio.ativar_por_argumentos(args)
     asyncio.run(main())
+
+
+if __name__ == "__main__":
+    cli()
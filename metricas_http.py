@@ -0,0 +1,279 @@
+import atexit
+import json
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+
+# Métricas por endpoint e por vendedor de todas as chamadas HTTP de uma execução
+# (input_data, campaign_report, pipeline), gravadas em JSON e no formato texto do Prometheus.
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Trechos variáveis do caminho viram marcadores, para agrupar por endpoint
+PADROES_CAMINHO = (
+    (re.compile(r"/ML[A-Z]\d+"), "/{item_id}"),
+    (re.compile(r"/\d+"), "/{id}"),
+)
+
+
+def endpoint_de(url):
+    caminho = urlsplit(str(url)).path or "/"
+    for padrao, marcador in PADROES_CAMINHO:
+        caminho = padrao.sub(marcador, caminho)
+    return caminho
+
+def requisicao_de(url, params=None):
+    """Identifica a requisição inteira: páginas e lotes do mesmo endpoint só mudam nos params."""
+    if not params:
+        return str(url)
+    return f"{url}?{sorted((str(k), str(v)) for k, v in dict(params).items())}"
+
+def vendedor_de(headers):
+    """O token do Mercado Livre termina com o user_id (APP_USR-...-<USER_ID>)."""
+    token = (headers or {}).get("Authorization", "")
+    sufixo = token.rsplit("-", 1)[-1]
+    return sufixo if sufixo.isdigit() else "-"
+
+
+class Serie:
+    __slots__ = ("status", "retries", "bytes", "buckets", "soma_latencia", "contagem",
+                 "em_andamento", "max_em_andamento")
+
+    def __init__(self):
+        self.status = defaultdict(int)
+        self.retries = 0
+        self.bytes = 0
+        self.buckets = [0] * (len(BUCKETS_LATENCIA) + 1)
+        self.soma_latencia = 0.0
+        self.contagem = 0
+        self.em_andamento = 0
+        self.max_em_andamento = 0
+
+    def resumo(self):
+        return {
+            "requests": self.contagem,
+            "status": dict(self.status),
+            "retries": self.retries,
+            "bytes": self.bytes,
+            "latency_sum_s": round(self.soma_latencia, 4),
+            "latency_avg_ms": round(1000 * self.soma_latencia / self.contagem, 2) if self.contagem else None,
+            "latency_buckets": dict(zip([str(b) for b in BUCKETS_LATENCIA] + ["+Inf"], self.buckets)),
+            "in_flight": self.em_andamento,
+            "in_flight_max": self.max_em_andamento,
+        }
+
+
+class MetricasHttp:
+    def __init__(self):
+        self.series = defaultdict(Serie)
+        self._falhas_recentes = set()
+        self._lock = threading.Lock()
+
+    def inicio(self, url, headers, params=None):
+        """Chamado antes da requisição; retorna o contexto a passar para fim()."""
+        chave = (endpoint_de(url), vendedor_de(headers))
+        requisicao = requisicao_de(url, params)
+        with self._lock:
+            serie = self.series[chave]
+            serie.em_andamento += 1
+            serie.max_em_andamento = max(serie.max_em_andamento, serie.em_andamento)
+            # A mesma requisição (URL e parâmetros) logo depois de um 429/5xx/erro conta como nova tentativa
+            if requisicao in self._falhas_recentes:
+                self._falhas_recentes.discard(requisicao)
+                serie.retries += 1
+        return chave, requisicao, time.perf_counter()
+
+    def fim(self, contexto, status, tamanho):
+        chave, requisicao, inicio = contexto
+        latencia = time.perf_counter() - inicio
+        with self._lock:
+            serie = self.series[chave]
+            serie.em_andamento -= 1
+            serie.contagem += 1
+            serie.status[str(status)] += 1
+            serie.bytes += tamanho
+            serie.soma_latencia += latencia
+            serie.buckets[bisect_left(BUCKETS_LATENCIA, latencia)] += 1
+            if status == "error" or status == 429 or status >= 500:
+                self._falhas_recentes.add(requisicao)
+
+    # --- saída ---
+    def _agrupar(self, indice):
+        grupos = defaultdict(Serie)
+        for chave, serie in self.series.items():
+            g = grupos[chave[indice]]
+            for status, n in serie.status.items():
+                g.status[status] += n
+            g.retries += serie.retries
+            g.bytes += serie.bytes
+            g.buckets = [a + b for a, b in zip(g.buckets, serie.buckets)]
+            g.soma_latencia += serie.soma_latencia
+            g.contagem += serie.contagem
+            g.em_andamento += serie.em_andamento
+            g.max_em_andamento = max(g.max_em_andamento, serie.max_em_andamento)
+        return {nome: g.resumo() for nome, g in sorted(grupos.items())}
+
+    def para_json(self):
+        with self._lock:
+            return {
+                "endpoints": self._agrupar(0),
+                "sellers": self._agrupar(1),
+                "series": [dict(endpoint=e, seller=v, **s.resumo()) for (e, v), s in sorted(self.series.items())],
+            }
+
+    def para_prometheus(self):
+        linhas = []
+
+        def metrica(nome, tipo, ajuda):
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+
+        with self._lock:
+            series = sorted(self.series.items())
+            rotulos = {chave: f'endpoint="{chave[0]}",seller="{chave[1]}"' for chave, _ in series}
+
+            metrica("gobots_http_requests_total", "counter", "Requisições por endpoint, vendedor e status")
+            for chave, s in series:
+                for status, n in sorted(s.status.items()):
+                    linhas.append(f'gobots_http_requests_total{{{rotulos[chave]},status="{status}"}} {n}')
+
+            metrica("gobots_http_retries_total", "counter", "Novas tentativas depois de 429/5xx/erro")
+            for chave, s in series:
+                linhas.append(f"gobots_http_retries_total{{{rotulos[chave]}}} {s.retries}")
+
+            metrica("gobots_http_response_bytes_total", "counter", "Bytes recebidos no corpo das respostas")
+            for chave, s in series:
+                linhas.append(f"gobots_http_response_bytes_total{{{rotulos[chave]}}} {s.bytes}")
+
+            metrica("gobots_http_request_duration_seconds", "histogram", "Latência das requisições")
+            for chave, s in series:
+                acumulado = 0
+                for limite, n in zip(list(BUCKETS_LATENCIA) + ["+Inf"], s.buckets):
+                    acumulado += n
+                    linhas.append(f'gobots_http_request_duration_seconds_bucket{{{rotulos[chave]},le="{limite}"}} {acumulado}')
+                linhas.append(f"gobots_http_request_duration_seconds_sum{{{rotulos[chave]}}} {s.soma_latencia:.6f}")
+                linhas.append(f"gobots_http_request_duration_seconds_count{{{rotulos[chave]}}} {s.contagem}")
+
+            metrica("gobots_http_in_flight", "gauge", "Requisições em andamento")
+            for chave, s in series:
+                linhas.append(f"gobots_http_in_flight{{{rotulos[chave]}}} {s.em_andamento}")
+
+            metrica("gobots_http_in_flight_max", "gauge", "Máximo de requisições simultâneas na execução")
+            for chave, s in series:
+                linhas.append(f"gobots_http_in_flight_max{{{rotulos[chave]}}} {s.max_em_andamento}")
+        return "\n".join(linhas) + "\n"
+
+    def salvar(self, prefixo):
+        with open(f"{prefixo}.json", "w", encoding="utf-8") as f:
+            json.dump(self.para_json(), f, indent=2, ensure_ascii=False)
+        with open(f"{prefixo}.prom", "w", encoding="utf-8") as f:
+            f.write(self.para_prometheus())
+        print(f"[INFO] Métricas HTTP gravadas em {prefixo}.json e {prefixo}.prom")
+
+    # --- adaptadores ---
+    def cliente_requests(self, cliente):
+        return _ClienteRequests(self, cliente)
+
+    def envolver_sessao(self, session):
+        return _SessaoAiohttp(self, session)
+
+
+# ======================================================
+# requests (campaign_report.py)
+# ======================================================
+class _ClienteRequests:
+    def __init__(self, metricas, cliente):
+        self.metricas = metricas
+        self.cliente = cliente
+
+    def get(self, url, headers=None, **kwargs):
+        contexto = self.metricas.inicio(url, headers, kwargs.get("params"))
+        try:
+            resp = self.cliente.get(url, headers=headers, **kwargs)
+        except Exception:
+            self.metricas.fim(contexto, "error", 0)
+            raise
+        self.metricas.fim(contexto, resp.status_code, len(resp.content or b""))
+        return resp
+
+
+# ======================================================
+# aiohttp (input_data.py / pipeline.py)
+# ======================================================
+class _Requisicao:
+    def __init__(self, sessao, url, kwargs):
+        self.sessao = sessao
+        self.url = url
+        self.kwargs = kwargs
+        self._contexto_http = None
+
+    async def __aenter__(self):
+        metricas = self.sessao.metricas
+        contexto = metricas.inicio(self.url, self.kwargs.get("headers"), self.kwargs.get("params"))
+        try:
+            self._contexto_http = self.sessao.session.get(self.url, **self.kwargs)
+            resp = await self._contexto_http.__aenter__()
+            corpo = await resp.read()
+        except Exception:
+            metricas.fim(contexto, "error", 0)
+            raise
+        metricas.fim(contexto, resp.status, len(corpo))
+        return resp
+
+    async def __aexit__(self, *exc):
+        if self._contexto_http is not None:
+            return await self._contexto_http.__aexit__(*exc)
+
+
+class _SessaoAiohttp:
+    def __init__(self, metricas, session):
+        self.metricas = metricas
+        self.session = session
+
+    def get(self, url, **kwargs):
+        return _Requisicao(self, url, kwargs)
+
+    def __getattr__(self, nome):
+        return getattr(self.session, nome)
+
+    async def __aenter__(self):
+        await self.session.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        return await self.session.__aexit__(*exc)
+
+
+# ======================================================
+# ATIVAÇÃO PELOS SCRIPTS
+# ======================================================
+def adicionar_argumentos(parser):
+    parser.add_argument("--metrics", metavar="PREFIXO",
+                        help="Ao final, grava métricas HTTP por endpoint/vendedor em PREFIXO.json e PREFIXO.prom")
+
+def ativar(prefixo=None, modulos=()):
+    """
+    Envolve campaign_report.cliente_http e input_data.session_wrapper (quando
+    existirem) por cima do que já estiver lá (ex.: o cassette). Com prefixo,
+    grava as métricas ao final do processo.
+    """
+    metricas = MetricasHttp()
+    for modulo in modulos:
+        if hasattr(modulo, "cliente_http"):
+            modulo.cliente_http = metricas.cliente_requests(modulo.cliente_http)
+        if hasattr(modulo, "session_wrapper"):
+            anterior = modulo.session_wrapper
+            modulo.session_wrapper = (
+                lambda s, anterior=anterior: metricas.envolver_sessao(anterior(s) if anterior else s)
+            )
+    if prefixo:
+        atexit.register(metricas.salvar, prefixo)
+    return metricas
+
+def ativar_por_argumentos(args, *modulos):
+    if not args.metrics:
+        return None
+    return ativar(args.metrics, modulos)
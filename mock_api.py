@@ -0,0 +1,440 @@
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict
+
+import numpy as np
+from aiohttp import web
+
+
+# ======================================================
+# 1) DADOS SINTÉTICOS (N vendedores × M itens × K pedidos)
+# ======================================================
+PRIMEIRO_USER_ID = 100000
+PRIMEIRO_ITEM = 1000000000
+# Fração dos itens de cada vendedor que estão em Product Ads
+FRACAO_ITENS_ADS = 0.2
+# Quantos itens por campanha
+ITENS_POR_CAMPANHA = 50
+# Maior offset aceito em buscas paginadas por offset (como na API real)
+OFFSET_MAXIMO = 1000
+
+HEALTHS = [None, "healthy", "warning", "unhealthy"]
+NIVEIS = [("healthy", "Profissional"), ("warning", "Satisfatória"), ("unhealthy", "Básica")]
+
+
+class DadosSinteticos:
+    """
+    Base fake de vendedores, itens, pedidos e campanhas.
+    Os atributos de cada item são derivados do próprio número (não ficam em
+    memória), só os pedidos são guardados, como um array de índices por vendedor.
+    """
+    def __init__(self, vendedores=5, itens=200, pedidos=1000, seed=42):
+        self.vendedores = vendedores
+        self.itens = itens
+        self.pedidos = pedidos
+        self.user_ids = [PRIMEIRO_USER_ID + v for v in range(vendedores)]
+        rng = np.random.default_rng(seed)
+        # Vendas concentradas em poucos itens (Zipf), como nas lojas reais
+        self.pedidos_por_vendedor = [
+            (rng.zipf(1.5, pedidos) - 1) % itens for _ in range(vendedores)
+        ]
+        self.vendidos_por_vendedor = [np.bincount(p, minlength=itens) for p in self.pedidos_por_vendedor]
+
+    # --- vendedores e tokens ---
+    def token(self, user_id):
+        return f"APP_USR-MOCK-0-0-{user_id}"
+
+    def tem_vendedor(self, user_id):
+        return PRIMEIRO_USER_ID <= user_id < PRIMEIRO_USER_ID + self.vendedores
+
+    def usuario(self, user_id):
+        return {
+            "id": user_id,
+            "nickname": f"LOJA_MOCK_{user_id}",
+            "permalink": f"http://perfil.mercadolivre.com.br/LOJA_MOCK_{user_id}",
+        }
+
+    # --- itens ---
+    def item_id(self, user_id, indice):
+        return f"MLB{PRIMEIRO_ITEM + (user_id - PRIMEIRO_USER_ID) * self.itens + indice}"
+
+    def localizar_item(self, item_id):
+        """Retorna (user_id, indice) ou None se o id não for de um item da base."""
+        try:
+            n = int(item_id[3:]) - PRIMEIRO_ITEM
+        except ValueError:
+            return None
+        if not item_id.startswith("MLB") or n < 0 or n >= self.vendedores * self.itens:
+            return None
+        return PRIMEIRO_USER_ID + n // self.itens, n % self.itens
+
+    def item(self, item_id):
+        local = self.localizar_item(item_id)
+        if local is None:
+            return None
+        user_id, k = local
+        vendidos = int(self.vendidos_por_vendedor[user_id - PRIMEIRO_USER_ID][k])
+        return {
+            "id": item_id,
+            "seller_id": user_id,
+            "title": f"Produto {k} da loja {user_id}",
+            "price": round(10 + (k * 37 % 2000) + (k % 100) / 100, 2),
+            "permalink": f"https://produto.mercadolivre.com.br/{item_id}",
+            "pictures": [{"secure_url": f"https://http2.mlstatic.com/{item_id}-{p}.jpg"} for p in range(k % 8)],
+            "available_quantity": k % 50,
+            "initial_quantity": 50,
+            "sold_quantity": vendidos,
+            "date_created": f"2024-{1 + k % 12:02d}-{1 + k % 28:02d}T10:00:00.000Z",
+            "attributes": [{"id": "BRAND", "value_name": f"Marca {k % 13}" if k % 4 else ""}],
+            "category_id": f"MLB{1000 + k % 30}",
+            "domain_id": f"MLB-DOMINIO_{k % 10}",
+            "shipping": {"free_shipping": k % 3 != 0},
+            "listing_type_id": "gold_pro" if k % 2 else "gold_special",
+            "health": HEALTHS[k % len(HEALTHS)],
+        }
+
+    def visitas(self, item_id):
+        _, k = self.localizar_item(item_id)
+        return 20 + (k * 7919) % 3000
+
+    def performance(self, item_id):
+        _, k = self.localizar_item(item_id)
+        level, wording = NIVEIS[k % len(NIVEIS)]
+        pendentes = k % 4
+        return {
+            "entity_id": item_id,
+            "score": (k * 31) % 101,
+            "level": level,
+            "level_wording": wording,
+            "buckets": [{
+                "status": "PENDING" if pendentes else "COMPLETED",
+                "variables": [{"status": "PENDING", "rules": [{"status": "PENDING"}] * pendentes}] if pendentes else [],
+            }],
+        }
+
+    def posicao(self, item_id):
+        """Posição em destaques; só 1 a cada 5 itens aparece (os demais dão 404)."""
+        _, k = self.localizar_item(item_id)
+        return 1 + k % 20 if k % 5 == 0 else None
+
+    # --- pedidos ---
+    def pedidos_vendedor(self, user_id):
+        return self.pedidos_por_vendedor[user_id - PRIMEIRO_USER_ID]
+
+    # --- Product Ads ---
+    def itens_ads(self, user_id):
+        return [self.item_id(user_id, k) for k in range(max(1, int(self.itens * FRACAO_ITENS_ADS)))]
+
+    def campanhas(self, user_id):
+        total = max(1, len(self.itens_ads(user_id)) // ITENS_POR_CAMPANHA)
+        return [user_id * 1000 + c for c in range(total)]
+
+
+def metricas_ads(semente):
+    clicks = 5 + semente * 13 % 400
+    cost = round(clicks * (0.2 + semente % 9 / 10), 2)
+    units = semente % 25
+    amount = round(units * (30 + semente % 200), 2)
+    return {
+        "clicks": clicks,
+        "prints": clicks * (20 + semente % 30),
+        "ctr": round(100 / (20 + semente % 30), 2),
+        "cost": cost,
+        "cpc": round(cost / clicks, 2),
+        "acos": round(100 * cost / amount, 2) if amount else 0,
+        "units_quantity": units,
+        "direct_units_quantity": units // 2,
+        "indirect_units_quantity": units - units // 2,
+        "cvr": round(100 * units / clicks, 2),
+        "roas": round(amount / cost, 2) if cost else 0,
+        "sov": semente % 60,
+        "total_amount": amount,
+    }
+
+
+# ======================================================
+# 2) INJEÇÃO DE LATÊNCIA, ERROS E 429
+# ======================================================
+class Falhas:
+    def __init__(self, latencia_ms=0.0, jitter_ms=0.0, taxa_erro=0.0, taxa_429=0.0, retry_after=0, seed=0):
+        self.latencia_ms = latencia_ms
+        self.jitter_ms = jitter_ms
+        self.taxa_erro = taxa_erro
+        self.taxa_429 = taxa_429
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+
+
+@web.middleware
+async def middleware_falhas(request, handler):
+    app = request.app
+    falhas = app["falhas"]
+    rota = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+    if rota.startswith("/__"):
+        return await handler(request)
+
+    app["em_andamento"] += 1
+    inicio = time.perf_counter()
+    try:
+        atraso = falhas.latencia_ms + falhas.rng.uniform(0, falhas.jitter_ms)
+        if atraso > 0:
+            await asyncio.sleep(atraso / 1000)
+
+        sorteio = falhas.rng.random()
+        if sorteio < falhas.taxa_429:
+            resposta = web.json_response({"message": "too_many_requests"}, status=429,
+                                         headers={"Retry-After": str(falhas.retry_after)})
+        elif sorteio < falhas.taxa_429 + falhas.taxa_erro:
+            resposta = web.json_response({"message": "internal_error"}, status=500)
+        elif not request.headers.get("Authorization", "").startswith("Bearer "):
+            resposta = web.json_response({"message": "invalid_token"}, status=401)
+        else:
+            resposta = await handler(request)
+    except web.HTTPException as e:
+        resposta = web.json_response({"message": e.text}, status=e.status)
+    finally:
+        app["em_andamento"] -= 1
+
+    stats = app["stats"][rota]
+    stats["count"] += 1
+    stats[f"status_{resposta.status}"] += 1
+    stats["bytes"] += len(resposta.body or b"")
+    app["latencias"][rota].append(time.perf_counter() - inicio)
+    return resposta
+
+
+# ======================================================
+# 3) ENDPOINTS
+# ======================================================
+def _int(request, nome, padrao):
+    try:
+        return int(request.query.get(nome, padrao))
+    except ValueError:
+        raise web.HTTPBadRequest(text=f"invalid {nome}")
+
+def _paginar(request, total, limite_maximo=50, offset_maximo=OFFSET_MAXIMO):
+    limit = min(_int(request, "limit", limite_maximo), limite_maximo)
+    offset = _int(request, "offset", 0)
+    if offset_maximo is not None and offset > offset_maximo:
+        raise web.HTTPBadRequest(text=f"offset must be <= {offset_maximo}")
+    return offset, limit, {"total": total, "offset": offset, "limit": limit}
+
+def _projetar(body, atributos):
+    if not atributos:
+        return body
+    campos = atributos.split(",")
+    return {c: body[c] for c in campos if c in body}
+
+def _dados(request):
+    return request.app["dados"]
+
+
+async def ml_all(request):
+    dados = _dados(request)
+    return web.json_response([
+        {"user_id": uid, "access_token": dados.token(uid)} for uid in dados.user_ids
+    ])
+
+async def orders_search(request):
+    dados = _dados(request)
+    seller = _int(request, "seller", 0)
+    if not dados.tem_vendedor(seller):
+        return web.json_response({"message": "invalid seller"}, status=403)
+    pedidos = dados.pedidos_vendedor(seller)
+    # Sem teto de offset aqui: a coleta de pedidos pagina até o fim
+    offset, limit, paging = _paginar(request, len(pedidos), offset_maximo=None)
+    results = [{
+        "id": seller * 10**7 + n,
+        "status": "paid",
+        "order_items": [{"item": {"id": dados.item_id(seller, int(k))}, "quantity": 1}],
+    } for n, k in enumerate(pedidos[offset:offset + limit], start=offset)]
+    return web.json_response({"results": results, "paging": paging})
+
+async def items_multiget(request):
+    dados = _dados(request)
+    ids = [i for i in request.query.get("ids", "").split(",") if i]
+    if not ids or len(ids) > 20:
+        return web.json_response({"message": "ids must have 1 to 20 elements"}, status=400)
+    atributos = request.query.get("attributes")
+    resultado = []
+    for item_id in ids:
+        body = dados.item(item_id)
+        if body is None:
+            resultado.append({"code": 404, "body": {"message": f"Item with id {item_id} not found"}})
+        else:
+            resultado.append({"code": 200, "body": _projetar(body, atributos)})
+    return web.json_response(resultado)
+
+async def item_visits(request):
+    item_id = request.match_info["item_id"]
+    if _dados(request).localizar_item(item_id) is None:
+        return web.json_response({"message": "not_found"}, status=404)
+    return web.json_response({"item_id": item_id, "total_visits": _dados(request).visitas(item_id)})
+
+async def item_performance(request):
+    item_id = request.match_info["item_id"]
+    local = _dados(request).localizar_item(item_id)
+    # Alguns itens ainda não têm avaliação de qualidade
+    if local is None or local[1] % 11 == 10:
+        return web.json_response({"message": "not_found"}, status=404)
+    return web.json_response(_dados(request).performance(item_id))
+
+async def highlights(request):
+    item_id = request.match_info["item_id"]
+    if _dados(request).localizar_item(item_id) is None:
+        return web.json_response({"message": "not_found"}, status=404)
+    posicao = _dados(request).posicao(item_id)
+    if posicao is None:
+        return web.json_response({"message": "item is not in highlights"}, status=404)
+    return web.json_response({"id": item_id, "position": posicao})
+
+async def users_multiget(request):
+    dados = _dados(request)
+    resultado = []
+    for uid in request.query.get("ids", "").split(","):
+        uid = int(uid) if uid.isdigit() else -1
+        if dados.tem_vendedor(uid):
+            resultado.append({"code": 200, "body": dados.usuario(uid)})
+        else:
+            resultado.append({"code": 404, "body": {"message": "user not found"}})
+    return web.json_response(resultado)
+
+async def user(request):
+    uid = int(request.match_info["user_id"])
+    if not _dados(request).tem_vendedor(uid):
+        return web.json_response({"message": "user not found"}, status=404)
+    return web.json_response(_dados(request).usuario(uid))
+
+async def user_items_search(request):
+    """Busca por offset (até OFFSET_MAXIMO) ou scroll com search_type=scan."""
+    dados = _dados(request)
+    uid = int(request.match_info["user_id"])
+    if not dados.tem_vendedor(uid):
+        return web.json_response({"message": "user not found"}, status=404)
+    limit = min(_int(request, "limit", 50), 100)
+    if request.query.get("search_type") == "scan":
+        inicio = int(request.query.get("scroll_id") or 0)
+        fim = min(inicio + limit, dados.itens)
+        results = [dados.item_id(uid, k) for k in range(inicio, fim)]
+        return web.json_response({"results": results, "scroll_id": str(fim) if results else None,
+                                  "paging": {"total": dados.itens, "limit": limit}})
+    offset, limit, paging = _paginar(request, dados.itens, limite_maximo=100)
+    results = [dados.item_id(uid, k) for k in range(offset, min(offset + limit, dados.itens))]
+    return web.json_response({"results": results, "paging": paging})
+
+def _advertiser_para_user(request):
+    # O advertiser é o próprio user_id do token (APP_USR-...-<USER_ID>)
+    return int(request.headers["Authorization"].split("-")[-1])
+
+async def advertisers(request):
+    return web.json_response({"advertisers": [{
+        "advertiser_id": _advertiser_para_user(request), "site_id": "MLB", "product_id": "PADS",
+    }]})
+
+async def product_ads_campaigns(request):
+    uid = int(request.match_info["advertiser_id"])
+    if not _dados(request).tem_vendedor(uid):
+        return web.json_response({"message": "advertiser not found"}, status=404)
+    campanhas = _dados(request).campanhas(uid)
+    offset, limit, paging = _paginar(request, len(campanhas))
+    results = [{
+        "id": c,
+        "name": ["Campanha geral", "Mais vendidos", "Teste"][c % 3],
+        "status": "active" if c % 4 else "paused",
+        "budget": 50 + c % 7 * 10,
+        "strategy": "profitability",
+        "acos_target": 10 + c % 20,
+        "metrics": metricas_ads(c),
+    } for c in campanhas[offset:offset + limit]]
+    return web.json_response({"results": results, "paging": paging})
+
+async def product_ads_items(request):
+    dados = _dados(request)
+    uid = int(request.match_info["advertiser_id"])
+    if not dados.tem_vendedor(uid):
+        return web.json_response({"message": "advertiser not found"}, status=404)
+    itens = dados.itens_ads(uid)
+    campanhas = dados.campanhas(uid)
+    offset, limit, paging = _paginar(request, len(itens))
+    results = [{
+        "item_id": item_id,
+        "campaign_id": campanhas[n // ITENS_POR_CAMPANHA % len(campanhas)],
+        "title": f"Produto {n} da loja {uid}",
+        "status": "active",
+        "price": dados.item(item_id)["price"],
+        "metrics": metricas_ads(n),
+    } for n, item_id in enumerate(itens[offset:offset + limit], start=offset)]
+    return web.json_response({"results": results, "paging": paging})
+
+async def stats(request):
+    """Contagens, status, bytes e latência (p50/p99, em ms) por rota; ?reset=1 zera."""
+    app = request.app
+    resumo = {}
+    for rota, contagem in app["stats"].items():
+        lat = np.array(app["latencias"][rota]) * 1000
+        resumo[rota] = dict(contagem, p50_ms=round(float(np.percentile(lat, 50)), 2),
+                            p99_ms=round(float(np.percentile(lat, 99)), 2))
+    if request.query.get("reset"):
+        app["stats"].clear()
+        app["latencias"].clear()
+    return web.json_response({"em_andamento": app["em_andamento"], "rotas": resumo})
+
+
+# ======================================================
+# 4) SERVIDOR
+# ======================================================
+def criar_app(dados, falhas=None):
+    app = web.Application(middlewares=[middleware_falhas])
+    app["dados"] = dados
+    app["falhas"] = falhas or Falhas()
+    app["stats"] = defaultdict(lambda: defaultdict(int))
+    app["latencias"] = defaultdict(list)
+    app["em_andamento"] = 0
+    app.router.add_get("/ml/all", ml_all)
+    app.router.add_get("/orders/search", orders_search)
+    app.router.add_get("/items", items_multiget)
+    app.router.add_get("/items/{item_id}/visits", item_visits)
+    app.router.add_get("/item/{item_id}/performance", item_performance)
+    app.router.add_get("/user-product/{item_id}/performance", item_performance)
+    app.router.add_get("/highlights/{site_id}/item/{item_id}", highlights)
+    app.router.add_get("/users", users_multiget)
+    app.router.add_get(r"/users/{user_id:\d+}", user)
+    app.router.add_get(r"/users/{user_id:\d+}/items/search", user_items_search)
+    app.router.add_get("/advertising/advertisers", advertisers)
+    app.router.add_get(r"/advertising/advertisers/{advertiser_id:\d+}/product_ads/campaigns", product_ads_campaigns)
+    app.router.add_get(r"/advertising/advertisers/{advertiser_id:\d+}/product_ads/items", product_ads_items)
+    app.router.add_get("/__stats", stats)
+    return app
+
+def executar_servidor(host="127.0.0.1", port=8089, vendedores=5, itens=200, pedidos=1000, seed=42,
+                      latencia_ms=0.0, jitter_ms=0.0, taxa_erro=0.0, taxa_429=0.0, retry_after=0):
+    """Sobe o mock e bloqueia até ser interrompido (usado pela CLI e pelo bench_api.py)."""
+    dados = DadosSinteticos(vendedores, itens, pedidos, seed)
+    falhas = Falhas(latencia_ms, jitter_ms, taxa_erro, taxa_429, retry_after, seed)
+    web.run_app(criar_app(dados, falhas), host=host, port=port, print=None, access_log=None)
+
+def adicionar_argumentos(parser):
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latência fixa por requisição")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Latência extra aleatória (0 a N ms)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fração de respostas 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fração de respostas 429")
+    parser.add_argument("--retry-after", type=int, default=0, help="Valor do Retry-After nas respostas 429")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock local das APIs do Mercado Livre e da GoBots")
+    adicionar_argumentos(parser)
+    parser.add_argument("--sellers", type=int, default=5)
+    parser.add_argument("--items", type=int, default=200, help="Itens por vendedor")
+    parser.add_argument("--orders", type=int, default=1000, help="Pedidos por vendedor")
+    args = parser.parse_args()
+    print(f"[INFO] Mock em http://{args.host}:{args.port} "
+          f"(use ML_API_URL e GOBOTS_API_URL com esse endereço)")
+    executar_servidor(args.host, args.port, args.sellers, args.items, args.orders, args.seed,
+                      args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate,
+                      args.retry_after)
@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import os
+
+import cassette
+import input_data
+import metricas_http
+import rastreio
+import recommendation_report
+
+
+# Quantos DataFrames prontos podem esperar pela renderização (limita a memória)
+QUEUE_SIZE = 10
+# Quantos PDFs são renderizados ao mesmo tempo
+RENDER_WORKERS = 5
+
+
+# ======================================================
+# 1) COLETA: CADA VENDEDOR VAI PARA A FILA ASSIM QUE TERMINA
+# ======================================================
+async def collect_user(session, user_id, go_bots_data, queue, save_csv, store_infos=None):
+    try:
+        df = await input_data.process_user(session, user_id, go_bots_data, save_csv=save_csv,
+                                           store_infos=store_infos)
+    except Exception as e:
+        print(f"Error collecting user {user_id}: {str(e)}")
+        return
+    if df is not None:
+        name = f"{df['store_name'].iloc[0]}_{user_id}"
+        # Bloqueia quando a fila está cheia, segurando a coleta até a renderização alcançar
+        await queue.put((name, df))
+
+
+# ======================================================
+# 2) RENDERIZAÇÃO: CONSOME A FILA ENQUANTO A COLETA CONTINUA
+# ======================================================
+async def render_worker(queue, semaphore, renderer):
+    while True:
+        job = await queue.get()
+        try:
+            if job is None:
+                return
+            name, df = job
+            df = recommendation_report.prepare_input(df)
+            _, message = await recommendation_report.process_dataframe(semaphore, df, name, renderer=renderer)
+            print(message)
+        except Exception as e:
+            print(f"Error rendering {job[0]}: {str(e)}")
+        finally:
+            queue.task_done()
+
+
+async def main(save_csv=False, queue_size=QUEUE_SIZE, render_workers=RENDER_WORKERS,
+               renderer=recommendation_report.DEFAULT_RENDERER):
+    os.makedirs('output_pdf', exist_ok=True)
+    if save_csv:
+        os.makedirs('output_tables', exist_ok=True)
+
+    user_ids = input_data.load_user_ids()
+
+    queue = asyncio.Queue(maxsize=queue_size)
+    semaphore = asyncio.Semaphore(render_workers)
+    workers = [asyncio.create_task(render_worker(queue, semaphore, renderer)) for _ in range(render_workers)]
+
+    try:
+        limiter = input_data.AdaptiveLimiter()
+        async with input_data.create_session(limiter) as session:
+            go_bots_data = await input_data.get_go_bots_api_response(session)
+            if not go_bots_data:
+                print("Failed to fetch GoBots data")
+                return
+
+            store_infos = await input_data.prefetch_store_info(session, user_ids, go_bots_data)
+            tasks = [collect_user(session, uid, go_bots_data, queue, save_csv, store_infos) for uid in user_ids]
+            await asyncio.gather(*tasks)
+    finally:
+        # Um sinal de parada por worker, depois espera a fila esvaziar
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+
+def cli(argv=None, prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog, description='Coleta os dados dos vendedores e gera os PDFs no mesmo processo'
+    )
+    parser.add_argument('--save-csv', action='store_true', help='Também grava as tabelas em output_tables/')
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE)
+    parser.add_argument('--workers', type=int, default=RENDER_WORKERS)
+    parser.add_argument('--renderer', choices=sorted(recommendation_report.PDF_RENDERERS),
+                        default=recommendation_report.DEFAULT_RENDERER)
+    cassette.adicionar_argumentos(parser)
+    metricas_http.adicionar_argumentos(parser)
+    rastreio.adicionar_argumentos(parser)
+    args = parser.parse_args(argv)
+    cassette.ativar_por_argumentos(args, input_data)
+    metricas_http.ativar_por_argumentos(args, input_data)
+    rastreio.ativar_por_argumentos(args)
+    asyncio.run(main(save_csv=args.save_csv, queue_size=args.queue_size, render_workers=args.workers,
+                     renderer=args.renderer))
+
+
+if __name__ == "__main__":
+    cli()
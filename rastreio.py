@@ -0,0 +1,206 @@
+import asyncio
+import atexit
+import cProfile
+import functools
+import json
+import os
+import pstats
+import threading
+import time
+
+
+# Spans por etapa (input_data, recommendation_report, campaign_report), exportados no
+# formato Chrome trace (abre em chrome://tracing ou ui.perfetto.dev). Desligado por
+# padrão: sem --trace, span() devolve um contexto vazio e não mede nada.
+ATIVO = False
+# Com uma pasta, cada etapa também é perfilada com cProfile (um .prof por etapa)
+PASTA_PERFIS = None
+
+_eventos = []
+_raias = {}
+_perfis = {}
+# Um só profiler ativo por processo (no Python >= 3.12 o cProfile é por interpretador
+# e um segundo enable() levanta ValueError); a etapa que o pegou é dona dele até sair
+_perfil_ativo = None
+_lock = threading.Lock()
+_inicio = time.perf_counter()
+
+
+def _raia():
+    """Uma raia por task asyncio (ou por thread, fora do event loop)."""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    chave = ("task", id(task)) if task else ("thread", threading.get_ident())
+    with _lock:
+        if chave not in _raias:
+            nome = task.get_name() if task else threading.current_thread().name
+            _raias[chave] = (len(_raias) + 1, nome)
+        return _raias[chave][0]
+
+
+class _Span:
+    __slots__ = ("nome", "args", "raia", "inicio", "perfil")
+
+    def __init__(self, nome, args):
+        self.nome = nome
+        self.args = args
+        self.perfil = None
+
+    def __enter__(self):
+        global _perfil_ativo
+        self.raia = _raia()
+        # Etapas que começam enquanto outra está sendo perfilada (aninhadas ou em outras
+        # threads) só entram no trace. Em código asyncio o perfil de uma etapa também
+        # pega as tasks que rodaram durante os awaits.
+        if PASTA_PERFIS:
+            with _lock:
+                if _perfil_ativo is None:
+                    self.perfil = _perfis.setdefault(self.nome, cProfile.Profile())
+                    _perfil_ativo = self.perfil
+            if self.perfil is not None:
+                try:
+                    self.perfil.enable()
+                except ValueError:
+                    # Outra ferramenta (ex.: python -m cProfile) já está perfilando
+                    with _lock:
+                        _perfil_ativo = None
+                    self.perfil = None
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        global _perfil_ativo
+        fim = time.perf_counter()
+        if self.perfil is not None:
+            try:
+                self.perfil.disable()
+            finally:
+                with _lock:
+                    _perfil_ativo = None
+        evento = {
+            "name": self.nome,
+            "ph": "X",
+            "ts": round((self.inicio - _inicio) * 1e6, 1),
+            "dur": round((fim - self.inicio) * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": self.raia,
+        }
+        if self.args:
+            evento["args"] = self.args
+        if exc[0] is not None:
+            evento.setdefault("args", {})["erro"] = exc[0].__name__
+        with _lock:
+            _eventos.append(evento)
+        return False
+
+
+class _SpanVazio:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_VAZIO = _SpanVazio()
+
+
+def span(nome, **args):
+    """Contexto que mede uma etapa: `with rastreio.span("orders_scan", seller=uid): ...`"""
+    if not ATIVO:
+        return _VAZIO
+    return _Span(nome, args)
+
+def rastrear(nome=None):
+    """Decorador: a função inteira (sync ou async) vira um span."""
+    def decorador(funcao):
+        rotulo = nome or funcao.__name__
+        if asyncio.iscoroutinefunction(funcao):
+            @functools.wraps(funcao)
+            async def envolvida_async(*a, **kw):
+                with span(rotulo):
+                    return await funcao(*a, **kw)
+            return envolvida_async
+
+        @functools.wraps(funcao)
+        def envolvida(*a, **kw):
+            with span(rotulo):
+                return funcao(*a, **kw)
+        return envolvida
+    return decorador
+
+
+class Sequencia:
+    """
+    Etapas consecutivas de uma função longa sem reindentar o código:
+    etapa("b") fecha a etapa anterior e abre a próxima; fim() fecha a última.
+    """
+    def __init__(self, prefixo="", **args):
+        self.prefixo = prefixo
+        self.args = args
+        self.atual = None
+
+    def etapa(self, nome):
+        self.fim()
+        self.atual = span(f"{self.prefixo}{nome}", **self.args)
+        self.atual.__enter__()
+
+    def fim(self, *exc):
+        if self.atual is not None:
+            atual, self.atual = self.atual, None
+            atual.__exit__(*(exc or (None, None, None)))
+
+    # `with Sequencia(...) as trilha:` garante o fim() mesmo quando uma etapa levanta exceção
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fim(*exc)
+        return False
+
+
+# ======================================================
+# EXPORTAÇÃO
+# ======================================================
+def salvar_trace(caminho):
+    with _lock:
+        eventos = list(_eventos)
+        raias = list(_raias.values())
+    metadados = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": raia, "args": {"name": nome}}
+                 for raia, nome in raias]
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": metadados + eventos, "displayTimeUnit": "ms"}, f)
+    print(f"[INFO] Trace com {len(eventos)} spans gravado em {caminho}")
+
+def salvar_perfis(pasta):
+    os.makedirs(pasta, exist_ok=True)
+    with _lock:
+        perfis = dict(_perfis)
+    for nome, perfil in perfis.items():
+        pstats.Stats(perfil).dump_stats(os.path.join(pasta, f"{nome.replace('/', '_')}.prof"))
+    print(f"[INFO] {len(perfis)} perfis cProfile gravados em {pasta}")
+
+
+# ======================================================
+# ATIVAÇÃO PELOS SCRIPTS
+# ======================================================
+def adicionar_argumentos(parser):
+    parser.add_argument("--trace", metavar="ARQUIVO",
+                        help="Grava os spans de cada etapa em ARQUIVO (Chrome trace / Perfetto)")
+    parser.add_argument("--profile-dir", metavar="PASTA",
+                        help="Com --trace, também grava um cProfile (.prof) por etapa em PASTA")
+
+def ativar(caminho_trace, pasta_perfis=None):
+    global ATIVO, PASTA_PERFIS
+    ATIVO = True
+    PASTA_PERFIS = pasta_perfis
+    atexit.register(salvar_trace, caminho_trace)
+    if pasta_perfis:
+        atexit.register(salvar_perfis, pasta_perfis)
+
+def ativar_por_argumentos(args):
+    if args.trace:
+        ativar(args.trace, args.profile_dir)
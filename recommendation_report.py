@@ -1,38 +1,105 @@
+import argparse
 import asyncio
+import hashlib
 import io
+import json
 import os
 import subprocess
+import tempfile
+from pathlib import Path
 
-import aiofiles
+import numpy as np
 import pandas as pd
 from jinja2 import Environment, FileSystemLoader
-from playwright.async_api import async_playwright
+
+import rastreio
+
+# Number of rows per table in the "Outros produtos" section. Each chunk is
+# rendered as its own table so the browser never lays out one giant table.
+OTHERS_ROWS_PER_PAGE = 200
+# Optional cap on the number of rows rendered per section (None = no cap)
+MAX_ROWS_PER_SECTION = None
+# Order of the "others" section (also part of the manifest settings, so PDFs rendered
+# with the old unsorted order are rebuilt)
+OTHERS_SORT = ['sales', 'sales_potential']
+
+TEMPLATE_FILE = 'table_template.html'
+# Keeps a hash of every input used to build each PDF, so unchanged stores are skipped
+MANIFEST_FILE = os.path.join('output_pdf', 'manifest.json')
+
+PDF_OPTIONS = {
+    'width': '14.8in',
+    'height': '21in',
+    'margin': {'top': '0', 'right': '0', 'bottom': '0', 'left': '0'},
+    'print_background': True,
+}
+GHOSTSCRIPT_PDF_SETTINGS = '/ebook'
+GHOSTSCRIPT_EXECUTABLE = 'gswin64c'
+
+# Stand-in for the Bootstrap classes used by table_template.html, for backends that do not load it
+LIGHT_RENDERER_CSS = """
+@page { size: 14.8in 21in; margin: 0.3in; }
+body { font-family: Helvetica, Arial, sans-serif; font-size: 11pt; color: #212529; }
+h1 { font-size: 24pt; } h2 { font-size: 18pt; } h3 { font-size: 15pt; }
+.text-center { text-align: center; }
+.table { width: 100%; border-collapse: collapse; margin-bottom: 12pt; }
+.table td, .table th { padding: 4pt; border-bottom: 0.5pt solid #dee2e6; vertical-align: middle; }
+.table-dark th { background-color: #212529; color: #ffffff; }
+"""
 
 
 async def read_input(input_file):
-    async with aiofiles.open(input_file, mode='r', encoding="utf-8") as f:
-        content = await f.read()
-        df = pd.read_csv(io.StringIO(content))
+    # Parse the file directly from disk, off the event loop
+    df = await asyncio.to_thread(pd.read_csv, input_file)
+    return prepare_input(df)
 
+def prepare_input(df):
     df = filter_input(df)
 
     #Select the desired columns and format them
-    df['conversion'] = (df['conversion']).astype(float).map('{:.1%}'.format)
+    df['conversion'] = format_percent(df['conversion'])
 
     
     # Format the column as Brazilian Reais
-    df['price'] = df['price'].apply(lambda x: f"R${x:,.2f}")
-    df['sales_potential'] = df['sales_potential'].apply(lambda x: f"R${x:,.2f}")
+    df['price'] = format_brl(df['price'])
+    df['sales_potential'] = format_brl(df['sales_potential'])
 
     #Format stock column
     df['stock'] = df['stock'].fillna(0).astype(int)    
 
-    #Format position and quality_score columns
-    df['position'] = df['position'].fillna('-')
-    df['quality_score'] = df['quality_score'].fillna('-')
+    #Format position and quality_score columns (nullable ints come in when the frame did not go through a CSV)
+    df['position'] = df['position'].astype(float).fillna('-')
+    df['quality_score'] = df['quality_score'].astype(float).fillna('-')
 
     return df
 
+def _group_thousands(digits):
+    # '1234567' -> '1.234.567'
+    return digits.str.replace(r'(\d)(?=(\d{3})+$)', r'\1.', regex=True)
+
+def format_brl(series):
+    # Format a numeric column as Brazilian Reais (R$1.234,56), whole column at once
+    values = pd.to_numeric(series, errors='coerce').astype(float)
+    valid = np.isfinite(values)
+    cents = (values.where(valid, 0).abs() * 100).round().astype('int64')
+    reais = _group_thousands((cents // 100).astype(str))
+    frac = (cents % 100).astype(str).str.zfill(2)
+    sign = pd.Series(np.where(values < 0, '-', ''), index=series.index)
+    formatted = sign + 'R$' + reais + ',' + frac
+    return formatted.where(valid, '-')
+
+def format_percent(series, decimals=1):
+    # Format a ratio column as a Brazilian percentage (0.1234 -> 12,3%), whole column at once
+    values = pd.to_numeric(series, errors='coerce').astype(float)
+    valid = np.isfinite(values)
+    scale = 10 ** decimals
+    scaled = (values.where(valid, 0).abs() * 100 * scale).round().astype('int64')
+    formatted = _group_thousands((scaled // scale).astype(str))
+    if decimals > 0:
+        formatted = formatted + ',' + (scaled % scale).astype(str).str.zfill(decimals)
+    sign = pd.Series(np.where(values < 0, '-', ''), index=series.index)
+    return (sign + formatted + '%').where(valid, '-')
+
 def filter_input(df):
     # Calculate the cumulative sales
     df['cumulative_sales']  = df['sales']/df['sales'].sum()
@@ -63,105 +130,278 @@ def select_and_rename(df):
         df = df.drop(columns=['Posição Mais Vendidos'])
     return df
 
-async def convert_html_to_pdf(html_content, pdf_output_path):
-    try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch()
-            page = await browser.new_page()
-            
+def split_in_chunks(df, rows_per_page):
+    # Split the dataframe into page-sized chunks, keeping at least one (possibly empty) chunk
+    if rows_per_page is None or rows_per_page <= 0 or df.shape[0] <= rows_per_page:
+        return [df]
+    return [df.iloc[i:i+rows_per_page] for i in range(0, df.shape[0], rows_per_page)]
+
+def render_html_to_file(template, html_path, **context):
+    # Stream the template output straight to disk instead of building one big string
+    with open(html_path, 'w', encoding='utf-8') as f:
+        for piece in template.generate(**context):
+            f.write(piece)
+
+async def render_pdf_chromium(html_content, html_path=None):
+    # Imported here so the xhtml2pdf backend and the other entry points don't pay for it
+    from playwright.async_api import async_playwright
+    
+    async with async_playwright() as p:
+        browser = await p.chromium.launch()
+        page = await browser.new_page()
+        
+        # When the HTML was streamed to a file, let the browser load it from disk
+        if html_path:
+            await page.goto(Path(html_path).resolve().as_uri())
+        else:
             await page.set_content(html_content)
-            
-            pdf_bytes = await page.pdf(
-                width="14.8in",
-                height="21in",
-                margin={"top": "0", "right": "0", "bottom": "0", "left": "0"},
-                print_background=True
-            )
-            
-            await browser.close()
-
-            ghostscript_cmd = [
-                'gswin64c',
-                '-sDEVICE=pdfwrite',
-                '-dPDFSETTINGS=/ebook',
-                '-dNOPAUSE',
-                '-dQUIET',
-                '-dBATCH',
-                '-sOutputFile=-',
-                '-'
-            ]
-            
-            proc = await asyncio.to_thread(
-                subprocess.run,
-                ghostscript_cmd,
-                input=pdf_bytes,
-                capture_output=True,
-                check=True
-            )
-            
-            with open(pdf_output_path, 'wb') as f:
-                f.write(proc.stdout)
-            
-            print(f"Successfull PDF conversion: {pdf_output_path}")
-            return True
+        
+        pdf_bytes = await page.pdf(**PDF_OPTIONS)
+        
+        await browser.close()
+    return pdf_bytes
+
+def _render_pdf_xhtml2pdf(html_content, html_path=None):
+    # Optional dependency, only needed when this backend is selected
+    from xhtml2pdf import pisa
+    from xhtml2pdf.default import DEFAULT_CSS
+
+    def link_callback(uri, rel):
+        # Bootstrap is replaced by LIGHT_RENDERER_CSS; images are still fetched
+        if uri.split('?')[0].endswith('.css'):
+            return ''
+        return uri
+
+    out = io.BytesIO()
+    if html_path:
+        with open(html_path, 'rb') as src:
+            status = pisa.CreatePDF(src, dest=out, encoding='utf-8', link_callback=link_callback,
+                                    default_css=DEFAULT_CSS + LIGHT_RENDERER_CSS)
+    else:
+        status = pisa.CreatePDF(html_content, dest=out, link_callback=link_callback,
+                                default_css=DEFAULT_CSS + LIGHT_RENDERER_CSS)
+    if status.err:
+        raise RuntimeError(f"xhtml2pdf reported {status.err} error(s)")
+    return out.getvalue()
+
+async def render_pdf_xhtml2pdf(html_content, html_path=None):
+    # Pure Python, no browser: runs in a thread so it does not block the event loop
+    return await asyncio.to_thread(_render_pdf_xhtml2pdf, html_content, html_path)
+
+# Available HTML -> PDF backends. Each one takes (html_content, html_path) and returns the PDF bytes.
+PDF_RENDERERS = {
+    'chromium': render_pdf_chromium,
+    'xhtml2pdf': render_pdf_xhtml2pdf,
+}
+DEFAULT_RENDERER = 'chromium'
+
+def compress_pdf(pdf_bytes):
+    # Recompress the rendered PDF with Ghostscript (blocking, run it in a thread)
+    ghostscript_cmd = [
+        GHOSTSCRIPT_EXECUTABLE,
+        '-sDEVICE=pdfwrite',
+        f'-dPDFSETTINGS={GHOSTSCRIPT_PDF_SETTINGS}',
+        '-dNOPAUSE',
+        '-dQUIET',
+        '-dBATCH',
+        '-sOutputFile=-',
+        '-'
+    ]
+    proc = subprocess.run(ghostscript_cmd, input=pdf_bytes, capture_output=True, check=True)
+    return proc.stdout
+
+async def convert_html_to_pdf(html_content, pdf_output_path, html_path=None, renderer=DEFAULT_RENDERER):
+    try:
+        with rastreio.span(renderer):
+            pdf_bytes = await PDF_RENDERERS[renderer](html_content, html_path)
+
+        with rastreio.span('ghostscript', input_bytes=len(pdf_bytes)):
+            compressed = await asyncio.to_thread(compress_pdf, pdf_bytes)
+        
+        with open(pdf_output_path, 'wb') as f:
+            f.write(compressed)
+        
+        print(f"Successfull PDF conversion: {pdf_output_path}")
+        return True
 
     except Exception as e:
         if os.path.exists(pdf_output_path):
             os.remove(pdf_output_path)
         print(f"Error during PDF conversion: {str(e)}")
         return False
-async def process_file(semaphore, file):
+
+def file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def settings_hash(rows_per_page, max_rows, renderer=DEFAULT_RENDERER):
+    # Everything besides the CSV and the template that changes the rendered PDF
+    settings = {
+        'rows_per_page': rows_per_page,
+        'max_rows': max_rows,
+        'others_sort': OTHERS_SORT,
+        'renderer': renderer,
+        'pdf_options': PDF_OPTIONS,
+        'ghostscript': GHOSTSCRIPT_PDF_SETTINGS,
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+def load_manifest(path=MANIFEST_FILE):
     try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
 
-        # Set up Jinja2 environment
-        env = Environment(loader=FileSystemLoader('.'))
-        template = env.get_template('table_template.html')
+def save_manifest(manifest, path=MANIFEST_FILE):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
 
+def pdf_path_for(name):
+    return f'output_pdf/{name.removesuffix(".csv")}.pdf'
+
+async def process_file(semaphore, file, rows_per_page=OTHERS_ROWS_PER_PAGE, max_rows=MAX_ROWS_PER_SECTION,
+                       renderer=DEFAULT_RENDERER):
+    try:
         # Get the input dataframe
-        df = await read_input('output_tables\\' + file)
-        store_name = df['store_name'].iloc[0]
-        store_permalink = df['store_permalink'].iloc[0]
-        
-        df_rec = df[df['product_group'] == 2]
-        df_others = df[df['product_group'] == 1]
-        df_others.sort_values(by=['sales', 'sales_potential'], ascending=False)
-
-        df_rec = select_and_rename(df_rec)
-        df_others = select_and_rename(df_others)
-
-        html_output = template.render(
-            df_rec=df_rec,
-            df_others=df_others,
-            store_name=store_name,
-            store_permalink=store_permalink,
-            page_title_text='Recomendação de Produtos'
-        )
+        with rastreio.span('read_input', file=file):
+            df = await read_input('output_tables\\' + file)
+    except Exception as e:
+        return False, f"Error processing {file}: {str(e)}"
+
+    return await process_dataframe(semaphore, df, file.removesuffix(".csv"), rows_per_page, max_rows, renderer)
+
+def load_template():
+    # Set up Jinja2 environment
+    env = Environment(loader=FileSystemLoader('.'))
+    return env.get_template(TEMPLATE_FILE)
+
+def render_store_html(template, df, html_path, rows_per_page=OTHERS_ROWS_PER_PAGE, max_rows=MAX_ROWS_PER_SECTION):
+    # df must already have gone through prepare_input
+    store_name = df['store_name'].iloc[0]
+    store_permalink = df['store_permalink'].iloc[0]
+    
+    df_rec = df[df['product_group'] == 2]
+    df_others = df[df['product_group'] == 1]
+    # Sorted before max_rows cuts the section, so the capped table shows the top sellers
+    df_others = df_others.sort_values(by=OTHERS_SORT, ascending=False)
+
+    df_rec = select_and_rename(df_rec)
+    df_others = select_and_rename(df_others)
+
+    others_total = df_others.shape[0]
+    if max_rows is not None:
+        df_rec = df_rec.head(max_rows)
+        df_others = df_others.head(max_rows)
+
+    render_html_to_file(
+        template,
+        html_path,
+        df_rec=df_rec,
+        others_chunks=split_in_chunks(df_others, rows_per_page),
+        others_total=others_total,
+        others_shown=df_others.shape[0],
+        store_name=store_name,
+        store_permalink=store_permalink,
+        page_title_text='Recomendação de Produtos'
+    )
+
+async def process_dataframe(semaphore, df, name, rows_per_page=OTHERS_ROWS_PER_PAGE, max_rows=MAX_ROWS_PER_SECTION,
+                            renderer=DEFAULT_RENDERER):
+    # df must already have gone through prepare_input
+    html_path = None
+    try:
+        template = load_template()
+
+        fd, html_path = tempfile.mkstemp(suffix='.html')
+        os.close(fd)
+        # Template rendering is CPU-bound, keep it off the event loop
+        with rastreio.span('template_render', store=name, rows=int(df.shape[0])):
+            await asyncio.to_thread(render_store_html, template, df, html_path, rows_per_page, max_rows)
         
-        pdf_path = f'output_pdf/{file.removesuffix(".csv")}.pdf'
-        async with semaphore:
-            success = await convert_html_to_pdf(html_output, pdf_path)
+        pdf_path = pdf_path_for(name)
+        with rastreio.span('wait_pdf_slot', store=name):
+            await semaphore.acquire()
+        try:
+            success = await convert_html_to_pdf(None, pdf_path, html_path=html_path, renderer=renderer)
+        finally:
+            semaphore.release()
         
-        return f"Processed {file} - {'Success' if success else 'Failed'}"
+        return success, f"Processed {name} - {'Success' if success else 'Failed'}"
     
     except Exception as e:
-        return f"Error processing {file}: {str(e)}"
+        return False, f"Error processing {name}: {str(e)}"
+
+    finally:
+        if html_path and os.path.exists(html_path):
+            os.remove(html_path)
 
 
-async def main():
+async def main(force=False, renderer=DEFAULT_RENDERER):
     MAX_WORKERS = 5
     os.makedirs('output_pdf', exist_ok=True)
 
     # Listar todos os arquivos na pasta
     files = [f for f in os.listdir('output_tables') 
              if f.endswith('.csv') and os.path.isfile(os.path.join('output_tables', f))]
+
+    # Compare every input against the manifest of the previous run
+    manifest = load_manifest()
+    template_hash = file_hash(TEMPLATE_FILE)
+    render_hash = settings_hash(OTHERS_ROWS_PER_PAGE, MAX_ROWS_PER_SECTION, renderer)
+
+    entries = {}
+    to_build = []
+    for file in files:
+        entry = {
+            'input': file_hash(os.path.join('output_tables', file)),
+            'template': template_hash,
+            'settings': render_hash,
+        }
+        entries[file] = entry
+        if force or manifest.get(file) != entry or not os.path.exists(pdf_path_for(file)):
+            to_build.append(file)
+
+    # Drop outputs of stores whose table no longer exists
+    for file in set(manifest) - set(files):
+        if os.path.exists(pdf_path_for(file)):
+            os.remove(pdf_path_for(file))
+        print(f"Removed output for deleted table {file}")
+        del manifest[file]
+
+    print(f"{len(to_build)} of {len(files)} tables changed since last run")
     
     semaphore = asyncio.Semaphore(MAX_WORKERS)
 
-    tasks = [process_file(semaphore, file) for file in files]
+    tasks = [process_file(semaphore, file, renderer=renderer) for file in to_build]
     results = await asyncio.gather(*tasks)
     
-    for result in results:
-        print(result)
+    for file, (success, message) in zip(to_build, results):
+        if success:
+            manifest[file] = entries[file]
+        else:
+            manifest.pop(file, None)
+        print(message)
+
+    save_manifest(manifest)
+
+def cli(argv=None, prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog, description='Gera os PDFs de recomendação a partir de output_tables/'
+    )
+    parser.add_argument('--force', action='store_true', help='Rebuild every PDF, ignoring the manifest')
+    parser.add_argument('--renderer', choices=sorted(PDF_RENDERERS), default=DEFAULT_RENDERER,
+                        help='HTML to PDF backend (xhtml2pdf is lighter, chromium has full fidelity)')
+    rastreio.adicionar_argumentos(parser)
+    args = parser.parse_args(argv)
+    rastreio.ativar_por_argumentos(args)
+    asyncio.run(main(force=args.force, renderer=args.renderer))
+
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    cli()